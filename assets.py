@@ -0,0 +1,109 @@
+"""
+Кэш изображений.
+
+Изображения загружаются с диска и преобразуются под формат экрана (convert / convert_alpha)
+один раз, затем берутся из LRU-кэша по ключу (имя, colorkey). Поэтому повторное открытие
+меню и перезагрузка уровня не читают файлы и не создают новых поверхностей.
+Поверхности из кэша общие: их нельзя изменять, только рисовать.
+
+Фоновая предзагрузка декодирует файлы в отдельном потоке при запуске игры; преобразование
+под формат экрана выполняется в основном потоке при первом обращении.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import pygame
+
+
+class AssetCache:
+    """
+    LRU-кэш преобразованных изображений из папки directory со статистикой обращений.
+    """
+    def __init__(self, directory='data', capacity=64):
+        self.directory = directory
+        self.capacity = capacity
+        self.surfaces = OrderedDict()  # (имя, colorkey) -> преобразованная поверхность
+        self.decoded = {}  # имя -> декодированная в фоне поверхность, еще не преобразованная
+        self.lock = threading.Lock()
+        self.preloader = None
+        self.hits = 0
+        self.misses = 0
+        self.preloaded = 0  # Промахи, для которых файл уже декодировал фоновый поток
+        self.evictions = 0
+
+    def get(self, name, colorkey=None):
+        """
+        Возвращает изображение name. colorkey как в load_image: None - прозрачность из файла,
+        -1 - цвет левого верхнего пикселя, иначе цвет. Если файла нет - FileNotFoundError.
+        """
+        key = (name, colorkey)
+        image = self.surfaces.get(key)
+        if image is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        with self.lock:
+            image = self.decoded.pop(name, None)
+        if image is not None:
+            self.preloaded += 1
+        else:
+            image = self.decode(name)
+        image = self.convert(image, colorkey)
+
+        self.surfaces[key] = image
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return image
+
+    def decode(self, name):
+        fullname = os.path.join(self.directory, name)
+        if not os.path.isfile(fullname):
+            raise FileNotFoundError(fullname)
+        return pygame.image.load(fullname)
+
+    @staticmethod
+    def convert(image, colorkey):
+        if colorkey is not None:
+            image = image.convert()
+            if colorkey == -1:
+                colorkey = image.get_at((0, 0))
+            image.set_colorkey(colorkey)
+        else:
+            image = image.convert_alpha()
+        return image
+
+    def preload(self, names):
+        """
+        Запускает фоновый поток, который декодирует изображения names (можно передать генератор,
+        он выполнится в том же потоке). Уже загруженные и отсутствующие файлы пропускаются.
+        """
+        def worker():
+            for name in names:
+                with self.lock:
+                    if name in self.decoded:
+                        continue
+                if any(key[0] == name for key in list(self.surfaces)):
+                    continue
+                try:
+                    image = self.decode(name)
+                except (FileNotFoundError, pygame.error):
+                    continue
+                with self.lock:
+                    self.decoded[name] = image
+
+        self.preloader = threading.Thread(target=worker, daemon=True)
+        self.preloader.start()
+        return self.preloader
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'preloaded': self.preloaded,
+            'evictions': self.evictions,
+            'cached': len(self.surfaces),
+        }
@@ -0,0 +1,695 @@
+"""
+Бенчмарки курсора, столкновений и отрисовки без окна (видеодрайвер SDL dummy).
+
+Команды:
+    python benchmark.py suite [--levels level1.csv ...] [--backend auto|grid|numpy|stepping|bitmap]
+                              [--frames N] [--trajectory путь.json|путь.rpl] [--output результат.json]
+        Загружает каждый data/level*.csv через main.Level, прогоняет через Cursor.move
+        записанные или синтетические траектории мыши (рывки, спираль, случайное блуждание)
+        и сохраняет в JSON время проверки столкновений и отрисовки кадра с перцентилями.
+    python benchmark.py flicks [--level имя] [--count N]
+        Сравнивает поточечную проверку, аналитическую через collisions.UniformGrid
+        и векторную через collisions.WallArrays на случайных рывках и проверяет,
+        что результаты согласованы.
+    python benchmark.py render [--level имя] [--frames N]
+        FPS кадра игры без кэша фона, с кэшем фона, в режиме грязных прямоугольников
+        и с включенными замерами фаз кадра (оверлей profiling).
+    python benchmark.py transition [--first level9.csv] [--second level10.csv] [--repeat N]
+        Время кадра перехода на следующий уровень без предзагрузки и с предзагрузкой в фоне.
+    python benchmark.py restart [--level имя] [--repeat N]
+        Время перезапуска уровня: полная пересборка, повторный вход и level.reset().
+    python benchmark.py memory [--levels level1.csv ...]
+        Память собранного уровня: Python-объекты по tracemalloc и пиксели поверхностей.
+    python benchmark.py reload [--level имя] [--repeat N]
+        Обновление уровня после изменения одной строки (как в preview_level.py) против полной загрузки.
+    python benchmark.py motion [--level имя] [--count N] [--rate 1000]
+        Дуги мыши с частотой событий rate Гц при разном FPS: проверка только отрезка между
+        кадрами против пути из всех событий MOUSEMOTION кадра (Cursor.get_path) и совпадение
+        с проверкой по каждому событию.
+    python benchmark.py bitmap [--levels level1.csv ...] [--count N]
+        Растровая карта стен (collisions.OccupancyMap) против проверки по прямоугольникам
+        на каждом уровне: время построения, память и время на рывок; карта должна
+        совпадать с поточечной проверкой.
+    python benchmark.py records [--runs N]
+        Запросы экрана окончания игры (лучшее время и лучшие сплиты) к базе records с N забегами.
+"""
+import gc
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import main
+import collisions
+import input_log
+import records
+from level_cache import level_names
+
+
+def load_level(file_name):
+    """
+    Загружает уровень через main.Level так же, как это делает игра.
+    Возвращает курсор с загруженными объектами уровня.
+    """
+    cursor = main.Cursor((main.WIDTH / 2, main.HEIGHT / 2), main.load_image('cursor.png'))
+    main.cursor = cursor
+    main.level = main.Level([file_name])
+    return cursor
+
+
+def random_flicks(count, length=300, seed=0):
+    """
+    Генерирует случайные рывки мыши длиной до length внутри экрана.
+    """
+    rnd = random.Random(seed)
+    flicks = []
+    while len(flicks) < count:
+        x1, y1 = rnd.randrange(main.WIDTH), rnd.randrange(main.HEIGHT)
+        x2, y2 = x1 + rnd.randint(-length, length), y1 + rnd.randint(-length, length)
+        if 0 <= x2 < main.WIDTH and 0 <= y2 < main.HEIGHT:
+            flicks.append(((x1, y1), (x2, y2)))
+    return flicks
+
+
+def run(check, flicks):
+    """
+    Прогоняет все рывки через функцию check, возвращает результаты и время в секундах.
+    """
+    start = time.perf_counter()
+    results = [check(a, b) for a, b in flicks]
+    return results, time.perf_counter() - start
+
+
+def check_agreement(walls, index, count=2000, seed=1):
+    """
+    Сравнивает аналитическую проверку с поточечной на случайных отрезках.
+
+    Если поточечная проверка нашла столкновение, аналитическая должна вернуть
+    ту же стену и ту же позицию перед столкновением. Аналитическая проверка
+    может дополнительно (и раньше) находить касания углов, которые шаги по пикселям
+    перескакивают по диагонали; такие случаи считаются отдельно.
+    Возвращает (количество расхождений, количество касаний углов).
+    """
+    mismatches = corner_hits = 0
+    for length in (0, 1, 3, 20, 300):
+        for a, b in random_flicks(count // 5, length, seed + length):
+            old = collisions.step_line_and_check_collision(a, b, walls)
+            new = collisions.draw_line_and_check_collision(a, b, walls, index=index)
+            if new is not None and not collisions._get_contact(a, b, new['sprite'].rect, 1)[2]:
+                corner_hits += 1
+            elif old is None:
+                mismatches += new is not None
+            elif new is None or (old['sprite'], old['position_before']) != (new['sprite'], new['position_before']):
+                mismatches += 1
+                print('Расхождение:', a, b, old, new)
+    return mismatches, corner_hits
+
+
+def flicks_benchmark(file_name='level10.csv', count=200):
+    cursor = load_level(file_name)
+    flicks = random_flicks(count)
+    walls = cursor.level_objects
+    backends = {
+        'Поточечно, все стены': lambda a, b: collisions.step_line_and_check_collision(a, b, walls),
+        'Аналитически, сетка': lambda a, b: collisions.draw_line_and_check_collision(
+            a, b, walls, index=cursor.collision_index),
+    }
+    if collisions.numpy is not None:
+        arrays = collisions.WallArrays(walls)
+        backends['Векторно, numpy'] = lambda a, b: collisions.batch_check_collision(a, b, arrays)
+
+    print(f'Уровень: {file_name}, стен: {len(walls)}, рывков: {len(flicks)}')
+    results = {}
+    for name, check in backends.items():
+        results[name], elapsed = run(check, flicks)
+        print(f'{name}: {elapsed * 1000 / len(flicks):.3f} мс на рывок')
+
+    mismatches, corner_hits = check_agreement(walls, cursor.collision_index)
+    print(f'Расхождений: {mismatches}, дополнительных касаний углов: {corner_hits}')
+    if collisions.numpy is not None:
+        # Векторная проверка должна полностью совпадать с аналитической
+        batch_mismatches = sum(1 for x, y in zip(results['Аналитически, сетка'], results['Векторно, numpy'])
+                               if x != y)
+        print(f'Расхождений numpy с аналитической проверкой: {batch_mismatches}')
+        mismatches += batch_mismatches
+    return mismatches
+
+
+def render_benchmark(file_name='level10.csv', frames=300):
+    """
+    Сравнивает FPS кадра игры (main.update_frame и main.draw_frame) без кэша фона, с кэшем фона,
+    в режиме грязных прямоугольников и с оверлеем профилировщика.
+    """
+    cursor = load_level(file_name)
+    level = main.level
+    cursor_group = main.pygame.sprite.RenderUpdates(cursor)
+    print(f'Уровень: {file_name}, спрайтов: {len(level.sprites)}, кадров: {frames}')
+    modes = (
+        ('Без кэша фона', False, False, False),
+        ('С кэшем фона', True, False, False),
+        ('Грязные прямоугольники', True, True, False),
+        ('С кэшем фона и оверлеем профилировщика', True, False, True),
+    )
+    profiler = main.profiler
+    for name, use_cache, dirty_rects, profile in modes:
+        level.use_background_cache = use_cache
+        main.DIRTY_RECTS = dirty_rects
+        level.redraw = True
+        if profiler.enabled != profile:
+            profiler.toggle()
+        start = time.perf_counter()
+        for _ in range(frames):
+            profiler.begin_frame()
+            profiler.mark('events')
+            main.update_frame(cursor_group)
+            profiler.mark('update')
+            main.draw_frame(cursor_group)
+            profiler.end_frame()
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {frames / elapsed:.0f} FPS ({elapsed * 1000 / frames:.3f} мс на кадр)')
+    if profiler.enabled:
+        phases = ', '.join(f"{phase} {stats['mean']:.3f}" for phase, stats in profiler.summary().items())
+        print(f'Фазы кадра с оверлеем, мс: {phases}')
+        profiler.toggle()
+    level.use_background_cache = main.Level.use_background_cache
+    main.DIRTY_RECTS = False
+
+
+def transition_benchmark(first='level9.csv', second='level10.csv', repeat=10):
+    """
+    Время кадра перехода first -> second (level.load() при касании финиша и отрисовка кадра)
+    с синхронной загрузкой и с предзагрузкой следующего уровня в фоне.
+    """
+    for name, prefetch in (('Синхронная загрузка', False), ('Предзагрузка', True)):
+        main.Level.prefetch = prefetch
+        times = []
+        for _ in range(repeat):
+            main.Level.built_levels.clear()  # Первый вход на уровень, без собранных ранее
+            cursor = main.Cursor((main.WIDTH / 2, main.HEIGHT / 2), main.load_image('cursor.png'))
+            main.cursor = cursor
+            level = main.level = main.Level([first, second])
+            if level.prefetched:
+                level.prefetched[1].result()  # Уровень проходится дольше, чем собирается следующий
+            cursor_group = main.pygame.sprite.RenderUpdates(cursor)
+            start = time.perf_counter()
+            level.load()
+            main.draw_frame(cursor_group)
+            times.append((time.perf_counter() - start) * 1000)
+        stats = summarize(times)
+        print(f"{name}: {first} -> {second} кадр перехода p50 {stats['p50']:.2f} мс, max {stats['max']:.2f} мс")
+    main.Level.prefetch = True
+
+
+def restart_benchmark(file_name='level10.csv', repeat=50):
+    """
+    Время перезапуска уровня: полная пересборка, повторный вход через load()
+    с собранным ранее уровнем и level.reset().
+    """
+    load_level(file_name)
+    level = main.level
+
+    def rebuild():
+        main.Level.built_levels.clear()
+        level.load(file_name)
+
+    modes = (
+        ('Полная пересборка', rebuild),
+        ('Повторный вход', lambda: level.load(file_name)),
+        ('Перезапуск reset()', level.reset),
+    )
+    for name, restart in modes:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            restart()
+            times.append((time.perf_counter() - start) * 1000)
+        stats = summarize(times)
+        print(f"{name}: {file_name} p50 {stats['p50']:.3f} мс, max {stats['max']:.3f} мс")
+
+
+def memory_benchmark(levels=None):
+    """
+    Память Python-объектов собранного уровня (tracemalloc): спрайты, стены, индекс столкновений.
+    Пиксели поверхностей выделяет SDL, tracemalloc их не видит, поэтому они считаются отдельно.
+    """
+    levels = levels or level_names()
+    main.Level.report_wall_merging = True
+    load_level(levels[0])
+    results = {}
+    for file_name in levels:
+        main.Level.built_levels.clear()
+        main.level.prefetched = None
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        main.level.load(file_name)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        surfaces = [sprite.image for sprite in main.level.sprites]
+        pixels = sum(surface.get_width() * surface.get_height() * surface.get_bytesize() for surface in surfaces)
+        results[file_name] = {'python_kb': used / 1024, 'surfaces': len(surfaces), 'surface_pixels_kb': pixels / 1024}
+        print(f'{file_name:12} Python-объекты {used / 1024:8.1f} КБ, поверхностей {len(surfaces):5}, '
+              f'пиксели {pixels / 1024:8.1f} КБ')
+    main.Level.report_wall_merging = False
+    return results
+
+
+def grid_matches_walls(cursor):
+    """
+    Проверяет, что сетка столкновений содержит в точности стены уровня и каждая стена
+    есть во всех ячейках, которые задевает. Порядок стен не сравнивается: после reload()
+    новые стены стоят в сетке последними (см. main.Level.reload).
+    """
+    index = cursor.collision_index
+    if {id(wall) for wall in cursor.level_objects} != set(index.indices):
+        return False
+    for wall in cursor.level_objects:
+        i = index.indices[id(wall)]
+        rect = wall.rect
+        if rect.width > 0 and rect.height > 0:
+            cells = index._cells_for(rect.left, rect.top, rect.right, rect.bottom)
+            if any(i not in index.cells.get(cell, ()) for cell in cells):
+                return False
+    return True
+
+
+def reload_benchmark(file_name='level10.csv', repeat=10):
+    """
+    Время обновления уровня после изменения одной строки: level.reload() против полной загрузки.
+    Уровень копируется во временную папку, исходный файл не меняется. Фон и сетка столкновений
+    после reload() сравниваются с полной загрузкой того же файла. Стены, как в preview_level.py,
+    не объединяются.
+    """
+    main.Level.use_wall_merging = False
+    with open(os.path.join('data', file_name), 'r') as f:
+        lines = f.read().splitlines()
+    editable = [i for i, line in enumerate(lines) if line.startswith(('wall;', 'redwall;'))]
+    path = os.path.join(tempfile.mkdtemp(), file_name)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    load_level(path)
+    level = main.level
+    rnd = random.Random(0)
+    reload_ms, load_ms = [], []
+    mismatches = 0
+    for _ in range(repeat):
+        i = rnd.choice(editable)
+        obj, *coords = lines[i].split(';')
+        lines[i] = ';'.join([obj] + [str(int(value) + rnd.choice((-2, 2))) for value in coords])
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines))
+
+        start = time.perf_counter()
+        level.reload(path)
+        reload_ms.append((time.perf_counter() - start) * 1000)
+        reloaded = main.pygame.image.tobytes(level.background, 'RGB')
+        mismatches += not grid_matches_walls(main.cursor)
+
+        main.Level.built_levels.clear()
+        start = time.perf_counter()
+        level.load(path)
+        load_ms.append((time.perf_counter() - start) * 1000)
+        loaded = main.pygame.image.tobytes(level.background, 'RGB')
+        mismatches += reloaded != loaded
+    for name, times in (('Полная загрузка', load_ms), ('reload()', reload_ms)):
+        stats = summarize(times)
+        print(f"{name}: {file_name} p50 {stats['p50']:.2f} мс, max {stats['max']:.2f} мс")
+    print('Расхождений reload() с полной загрузкой:', mismatches)
+    main.Level.use_wall_merging = True
+    return mismatches
+
+
+def random_arcs(count, rate, duration=0.5, seed=0):
+    """
+    Пути мыши по дугам окружностей: позиции событий MOUSEMOTION с частотой rate Гц.
+    """
+    rnd = random.Random(seed)
+    arcs = []
+    while len(arcs) < count:
+        cx, cy = rnd.randrange(main.WIDTH), rnd.randrange(main.HEIGHT)
+        radius = rnd.uniform(30, 200)
+        angle = rnd.uniform(0, 2 * math.pi)
+        sweep = rnd.choice((-1, 1)) * rnd.uniform(math.pi / 2, 2 * math.pi)
+        samples = int(rate * duration)
+        points = [(round(cx + radius * math.cos(angle + sweep * i / samples)),
+                   round(cy + radius * math.sin(angle + sweep * i / samples))) for i in range(samples + 1)]
+        if all(0 <= x < main.WIDTH and 0 <= y < main.HEIGHT for x, y in points):
+            arcs.append(points)
+    return arcs
+
+
+def first_collision(cursor, frames, use_motion):
+    """
+    Проходит путь, разбитый на кадры, до первого столкновения. Возвращает позицию перед ним
+    (или None) и время проверок. use_motion - проверять путь через все события кадра, иначе
+    только отрезок между позициями мыши в соседних кадрах.
+    """
+    cursor.prev_pos = frames[0][0]
+    elapsed = 0.0
+    for chunk in frames:
+        start = time.perf_counter()
+        if use_motion:
+            cursor.motion = list(chunk[:-1])
+            collision_info = cursor.check_path(cursor.get_path(chunk[-1]))
+        else:
+            collision_info = cursor.check_collision(cursor.prev_pos, chunk[-1])
+        elapsed += time.perf_counter() - start
+        if collision_info:
+            return collision_info['position_before'], elapsed
+        cursor.prev_pos = chunk[-1]
+    return None, elapsed
+
+
+def motion_benchmark(file_name='level6.csv', count=200, rate=1000, fps_list=(30, 60, 144)):
+    """
+    Сравнивает результат столкновений на дугах мыши при разном FPS с эталоном - проверкой
+    по каждому событию MOUSEMOTION: только отрезок между кадрами против пути кадра.
+    """
+    cursor = load_level(file_name)
+    arcs = random_arcs(count, rate)
+    reference = [first_collision(cursor, [[point] for point in arc], False)[0] for arc in arcs]
+    print(f'Уровень: {file_name}, дуг: {count}, событий мыши: {rate} Гц, '
+          f'со столкновением: {sum(result is not None for result in reference)}')
+    for fps in fps_list:
+        per_frame = max(1, rate // fps)
+        for name, use_motion in (('отрезок между кадрами', False), ('путь из событий кадра', True)):
+            matches, elapsed, frames_count = 0, 0.0, 0
+            for arc, expected in zip(arcs, reference):
+                frames = [arc[i:i + per_frame] for i in range(0, len(arc), per_frame)]
+                result, arc_elapsed = first_collision(cursor, frames, use_motion)
+                matches += result == expected
+                elapsed += arc_elapsed
+                frames_count += len(frames)
+            print(f'{fps} FPS, {name}: совпадает с эталоном {matches}/{count}, '
+                  f'{elapsed * 1e6 / frames_count:.1f} мкс на кадр')
+
+
+def bitmap_benchmark(levels=None, count=200):
+    """
+    Для каждого уровня: построение и память collisions.OccupancyMap против структур
+    для проверки по прямоугольникам (UniformGrid по tracemalloc, массивы WallArrays)
+    и время на рывок всеми способами. Возвращает количество расхождений карты
+    с поточечной проверкой (должно быть 0).
+    """
+    levels = levels or level_names()
+    flicks = random_flicks(count)
+    total_mismatches = 0
+    print(f"{'уровень':<13}{'стен':>6}{'карта, мс':>11}{'карта, КБ':>11}{'сетка, КБ':>11}{'numpy, КБ':>11}"
+          f"{'пикс.':>8}{'сетка':>8}{'numpy':>8}{'карта':>8}{'расх.':>7}{'углы':>6}")
+    for file_name in levels:
+        cursor = load_level(file_name)
+        walls = cursor.level_objects
+
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        grid = collisions.UniformGrid(walls)
+        grid_bytes = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        arrays = collisions.WallArrays(walls)
+        array_bytes = sum(array.nbytes for array in (arrays.x1, arrays.y1, arrays.x2, arrays.y2,
+                                                     arrays.kind, arrays.valid))
+        start = time.perf_counter()
+        occupancy = collisions.OccupancyMap(walls, main.WIDTH, main.HEIGHT)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        timings = {}
+        stepping, timings['stepping'] = run(
+            lambda a, b: collisions.step_line_and_check_collision(a, b, walls), flicks)
+        analytic, timings['grid'] = run(
+            lambda a, b: collisions.draw_line_and_check_collision(a, b, walls, index=grid), flicks)
+        _, timings['numpy'] = run(lambda a, b: collisions.batch_check_collision(a, b, arrays), flicks)
+        bitmap, timings['bitmap'] = run(
+            lambda a, b: collisions.bitmap_check_collision(a, b, occupancy, grid), flicks)
+
+        # Карта повторяет поточечную проверку; от аналитической отличается касаниями углов по диагонали
+        mismatches = sum(1 for old, new in zip(stepping, bitmap) if old != new)
+        corner_hits = sum(1 for old, new in zip(analytic, bitmap) if old != new)
+        total_mismatches += mismatches
+        per_flick = {name: elapsed * 1000 / len(flicks) for name, elapsed in timings.items()}
+        print(f"{file_name:<13}{len(walls):>6}{build_ms:>11.2f}{occupancy.nbytes() / 1024:>11.1f}"
+              f"{grid_bytes / 1024:>11.1f}{array_bytes / 1024:>11.1f}{per_flick['stepping']:>8.3f}"
+              f"{per_flick['grid']:>8.3f}{per_flick['numpy']:>8.3f}{per_flick['bitmap']:>8.3f}"
+              f"{mismatches:>7}{corner_hits:>6}")
+    print(f'Время - мс на рывок, рывков: {len(flicks)}; расхождений карты с поточечной проверкой: {total_mismatches}')
+    return total_mismatches
+
+
+def records_benchmark(runs=5000, repeat=50):
+    """
+    Заполняет временную базу records забегами по всем уровням и измеряет запросы экрана
+    окончания игры: лучшее общее время и лучший сплит каждого уровня.
+    """
+    levels = level_names()
+    store = records.RecordStore(os.path.join(tempfile.mkdtemp(), 'records.sqlite3'))
+    rnd = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(runs):
+        splits = [(name, rnd.uniform(2, 30)) for name in levels]
+        store.save_run(splits, sum(seconds for _, seconds in splits), player=rnd.choice(('a', 'b', 'c')))
+    queued = time.perf_counter()
+    store.flush()
+    written = time.perf_counter()
+    print(f'Забегов: {runs}, сплитов: {runs * len(levels)}; постановка в очередь {(queued - start) * 1000:.1f} мс, '
+          f'запись {(written - start) * 1000:.1f} мс')
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        store.best_total()
+        store.best_splits(levels)
+        times.append((time.perf_counter() - start) * 1000)
+    stats = summarize(times)
+    print(f"Запросы экрана окончания игры: p50 {stats['p50']:.3f} мс, max {stats['max']:.3f} мс")
+    plan = store.get_connection().execute('EXPLAIN QUERY PLAN SELECT MIN(seconds) FROM splits WHERE level = ?',
+                                          (levels[0],)).fetchall()
+    print('План запроса лучшего сплита:', '; '.join(row[-1] for row in plan))
+    store.close()
+
+
+def synthetic_trajectories(frames, seed=0):
+    """
+    Синтетические траектории мыши по кадрам: {название: [(x, y), ...]}.
+        - flicks: быстрые прямые рывки между случайными точками;
+        - spiral: раскручивающаяся спираль от центра экрана;
+        - random_walk: случайное блуждание небольшими шагами.
+    """
+    rnd = random.Random(seed)
+    center_x, center_y = main.WIDTH / 2, main.HEIGHT / 2
+
+    flicks = []
+    x, y = center_x, center_y
+    while len(flicks) < frames:
+        target_x, target_y = rnd.randrange(main.WIDTH), rnd.randrange(main.HEIGHT)
+        count = max(1, int(math.hypot(target_x - x, target_y - y) / 40))  # ~40 пикселей за кадр
+        for i in range(1, count + 1):
+            flicks.append((x + (target_x - x) * i / count, y + (target_y - y) * i / count))
+        x, y = target_x, target_y
+
+    spiral = []
+    for i in range(frames):
+        angle = i * 0.1
+        radius = min(main.WIDTH, main.HEIGHT) / 2 * i / frames
+        spiral.append((center_x + radius * math.cos(angle), center_y + radius * math.sin(angle)))
+
+    random_walk = []
+    x, y = center_x, center_y
+    for _ in range(frames):
+        x = min(max(x + rnd.randint(-8, 8), 0), main.WIDTH - 1)
+        y = min(max(y + rnd.randint(-8, 8), 0), main.HEIGHT - 1)
+        random_walk.append((x, y))
+
+    clamp = lambda pos: (int(min(max(pos[0], 0), main.WIDTH - 1)), int(min(max(pos[1], 0), main.HEIGHT - 1)))
+    return {
+        'flicks': [clamp(pos) for pos in flicks[:frames]],
+        'spiral': [clamp(pos) for pos in spiral],
+        'random_walk': [clamp(pos) for pos in random_walk],
+    }
+
+
+def load_trajectory(path):
+    """
+    Загружает записанную траекторию: JSON-список позиций [[x, y], ...]
+    или лог сессии main.py --record (позиции мыши по шагам симуляции).
+    """
+    if not path.endswith('.json'):
+        return input_log.InputReplay(path).positions()
+    with open(path, 'r') as f:
+        return [tuple(pos) for pos in json.load(f)]
+
+
+def summarize(samples):
+    """
+    Сводка по времени кадров в миллисекундах: среднее, перцентили и максимум.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    return {
+        'mean': sum(ordered) / len(ordered),
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': ordered[-1],
+    }
+
+
+def replay_trajectory(cursor, positions):
+    """
+    Прогоняет траекторию через курсор и кадр игры, как в main.main(), но без живой мыши.
+    Возвращает статистику времени проверки столкновений и отрисовки.
+    """
+    level = main.level
+    cursor_group = main.pygame.sprite.RenderUpdates(cursor)
+    cursor.update(level.mouse_pos)
+    level.redraw = True
+    collision_ms, draw_ms = [], []
+    collided = reloads = 0
+    for pos in positions:
+        level.update()
+        if level.levels_ended:
+            # Курсор дошел до финиша единственного уровня: загружаем его заново
+            level.cur_level, level.levels_ended = 0, False
+            level.load()
+            reloads += 1
+
+        start = time.perf_counter()
+        cursor.move(pos)
+        collision_ms.append((time.perf_counter() - start) * 1000)
+        collided += cursor.rect.topleft != tuple(pos)
+
+        start = time.perf_counter()
+        main.draw_frame(cursor_group)
+        draw_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        'frames': len(positions),
+        'collisions': collided,
+        'level_reloads': reloads,
+        'collision_ms': summarize(collision_ms),
+        'draw_ms': summarize(draw_ms),
+    }
+
+
+def suite_benchmark(levels=None, backend='auto', frames=600, trajectory=None, output=None):
+    """
+    Прогоняет траектории по всем уровням и возвращает результаты в виде словаря для JSON.
+    """
+    levels = levels or level_names()
+    trajectories = synthetic_trajectories(frames)
+    if trajectory:
+        trajectories = {os.path.basename(trajectory): load_trajectory(trajectory)}
+
+    main.Cursor.collision_backend = backend
+    results = {
+        'backend': backend,
+        'frames': frames,
+        'environment': {
+            'python': platform.python_version(),
+            'pygame': main.pygame.version.ver,
+            'numpy': collisions.numpy.__version__ if collisions.numpy is not None else None,
+            'dirty_rects': main.DIRTY_RECTS,
+        },
+        'levels': {},
+    }
+    for file_name in levels:
+        cursor = load_level(file_name)
+        level_result = {'walls': len(cursor.level_objects), 'trajectories': {}}
+        for name, positions in trajectories.items():
+            stats = replay_trajectory(cursor, positions)
+            level_result['trajectories'][name] = stats
+            print(f"{file_name:12} {name:12} столкновения p50 {stats['collision_ms']['p50']:.3f} "
+                  f"p99 {stats['collision_ms']['p99']:.3f} мс, отрисовка p50 {stats['draw_ms']['p50']:.3f} "
+                  f"p99 {stats['draw_ms']['p99']:.3f} мс")
+        results['levels'][file_name] = level_result
+    main.Cursor.collision_backend = 'auto'
+    results['assets'] = main.images.stats()
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print('Результаты сохранены в', output)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарки курсора, столкновений и отрисовки.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('suite', help='траектории мыши по всем уровням, результаты в JSON')
+    suite.add_argument('--levels', nargs='*')
+    suite.add_argument('--backend', default='auto', choices=('auto', 'grid', 'numpy', 'stepping', 'bitmap'))
+    suite.add_argument('--frames', type=int, default=600)
+    suite.add_argument('--trajectory', help='JSON-файл с траекторией [[x, y], ...] или лог сессии .rpl')
+    suite.add_argument('--output', help='куда сохранить результаты в JSON')
+
+    flicks = commands.add_parser('flicks', help='сравнение способов проверки столкновений на рывках')
+    flicks.add_argument('--level', default='level10.csv')
+    flicks.add_argument('--count', type=int, default=200)
+
+    render = commands.add_parser('render', help='FPS отрисовки в разных режимах')
+    render.add_argument('--level', default='level10.csv')
+    render.add_argument('--frames', type=int, default=300)
+
+    transition = commands.add_parser('transition', help='время кадра перехода на следующий уровень')
+    transition.add_argument('--first', default='level9.csv')
+    transition.add_argument('--second', default='level10.csv')
+    transition.add_argument('--repeat', type=int, default=10)
+
+    restart = commands.add_parser('restart', help='время перезапуска уровня')
+    restart.add_argument('--level', default='level10.csv')
+    restart.add_argument('--repeat', type=int, default=50)
+
+    memory = commands.add_parser('memory', help='память собранных уровней (tracemalloc)')
+    memory.add_argument('--levels', nargs='*')
+
+    reload = commands.add_parser('reload', help='обновление уровня после изменения строки')
+    reload.add_argument('--level', default='level10.csv')
+    reload.add_argument('--repeat', type=int, default=10)
+
+    motion = commands.add_parser('motion', help='путь мыши из событий MOUSEMOTION при разном FPS')
+    motion.add_argument('--level', default='level6.csv')
+    motion.add_argument('--count', type=int, default=200)
+    motion.add_argument('--rate', type=int, default=1000)
+
+    bitmap = commands.add_parser('bitmap', help='растровая карта стен против проверки по прямоугольникам')
+    bitmap.add_argument('--levels', nargs='*')
+    bitmap.add_argument('--count', type=int, default=200)
+
+    records_parser = commands.add_parser('records', help='запросы лучших результатов к базе забегов')
+    records_parser.add_argument('--runs', type=int, default=5000)
+
+    args = parser.parse_args()
+    if args.command == 'suite':
+        suite_benchmark(args.levels, args.backend, args.frames, args.trajectory, args.output)
+    elif args.command == 'flicks':
+        sys.exit(1 if flicks_benchmark(args.level, args.count) else 0)
+    elif args.command == 'transition':
+        transition_benchmark(args.first, args.second, args.repeat)
+    elif args.command == 'reload':
+        sys.exit(1 if reload_benchmark(args.level, args.repeat) else 0)
+    elif args.command == 'memory':
+        memory_benchmark(args.levels)
+    elif args.command == 'motion':
+        motion_benchmark(args.level, args.count, args.rate)
+    elif args.command == 'bitmap':
+        sys.exit(1 if bitmap_benchmark(args.levels, args.count) else 0)
+    elif args.command == 'records':
+        records_benchmark(args.runs)
+    elif args.command == 'restart':
+        restart_benchmark(args.level, args.repeat)
+    else:
+        render_benchmark(args.level, args.frames)
@@ -1,7 +1,22 @@
 # Функция для определения стороны столкновения
 import math
+import heapq
 import pygame
 
+try:
+    import numpy
+except ImportError:  # numpy необязателен, без него используется проверка на чистом pygame
+    numpy = None
+
+# Способ 'auto' проверяет отрезок векторно через numpy, только если на уровне не меньше
+# BATCH_THRESHOLD стен и отрезок не короче BATCH_MIN_LENGTH пикселей по главной оси.
+# По замерам (benchmark.py flicks и motion, отрезки из свободного места): на уровнях
+# до 90 стен сетка не медленнее numpy при любой длине отрезка, на level10 (1062 стены)
+# numpy быстрее на отрезках от 30-45 пикселей, а на коротких отрезках и путях из событий
+# мыши за кадр быстрее сетка - она останавливается на первом касании.
+BATCH_THRESHOLD = 256
+BATCH_MIN_LENGTH = 32
+
 
 def get_collision_side(rect1, rect2):
     """
@@ -61,16 +76,173 @@ def get_position_before_collision(start_pos, current_pos, collided_rect):
     # Если столкновения не произошло вообще, то возвращаем начальную точку.
     return start_pos
 
-# Функция для рисования линии и проверки столкновений
-def draw_line_and_check_collision(start_pos, end_pos, sprites, width = 1):
+
+class UniformGrid:
+    """
+    Статический пространственный индекс стен уровня в виде равномерной сетки.
+
+    Строится один раз при загрузке уровня: каждая ячейка хранит номера спрайтов,
+    прямоугольники которых ее задевают. Запрос возвращает только стены рядом
+    с заданной областью, в том же порядке, в каком они были переданы
+    (добавленные через add - после всех остальных).
+    """
+    def __init__(self, sprites=(), cell_size=32):
+        self.sprites = []
+        self.indices = {}  # id(спрайта) -> номер в self.sprites
+        self.cell_size = cell_size
+        self.cells = {}
+        for sprite in sprites:
+            self.add(sprite)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def add(self, sprite):
+        """
+        Добавляет спрайт в индекс последним по порядку.
+        """
+        i = len(self.sprites)
+        self.sprites.append(sprite)
+        self.indices[id(sprite)] = i
+        rect = sprite.rect
+        if rect.width <= 0 or rect.height <= 0:
+            return  # Пустые прямоугольники ни с чем не сталкиваются
+        for cell in self._cells_for(rect.left, rect.top, rect.right, rect.bottom):
+            self.cells.setdefault(cell, []).append(i)
+
+    def remove(self, sprite):
+        """
+        Убирает спрайт из индекса: из ячеек, которые задевает его прямоугольник.
+        Прямоугольник не должен меняться с момента добавления.
+        """
+        i = self.indices.pop(id(sprite))
+        self.sprites[i] = None
+        rect = sprite.rect
+        if rect.width > 0 and rect.height > 0:
+            for cell in self._cells_for(rect.left, rect.top, rect.right, rect.bottom):
+                indices = self.cells[cell]
+                indices.remove(i)
+                if not indices:
+                    del self.cells[cell]
+        # Освободившиеся места остаются пустыми, пока их не больше половины
+        if len(self.sprites) > 2 * len(self.indices) + 32:
+            self.compact()
+
+    def compact(self):
+        """
+        Убирает пустые места удаленных спрайтов и перенумеровывает оставшиеся в прежнем порядке.
+        """
+        new_ids = {}
+        sprites = []
+        for i, sprite in enumerate(self.sprites):
+            if sprite is not None:
+                new_ids[i] = len(sprites)
+                sprites.append(sprite)
+        self.sprites = sprites
+        self.indices = {id(sprite): i for i, sprite in enumerate(sprites)}
+        self.cells = {cell: [new_ids[i] for i in indices] for cell, indices in self.cells.items()}
+
+    def _cells_for(self, x1, y1, x2, y2):
+        """
+        Перебирает ячейки сетки, которые задевает область [x1, x2) x [y1, y2).
+        """
+        size = self.cell_size
+        for cx in range(x1 // size, (x2 - 1) // size + 1):
+            for cy in range(y1 // size, (y2 - 1) // size + 1):
+                yield cx, cy
+
+    def query(self, rect):
+        """
+        Возвращает спрайты, которые могут пересекаться с rect, в исходном порядке.
+        """
+        found = set()
+        for cell in self._cells_for(rect.left, rect.top, rect.right, rect.bottom):
+            indices = self.cells.get(cell)
+            if indices:
+                found.update(indices)
+        return [self.sprites[i] for i in sorted(found)]
+
+    def query_segment(self, start_pos, end_pos, width=1):
+        """
+        Возвращает спрайты рядом с движением курсора размера width по отрезку,
+        в исходном порядке. Перебираются только ячейки вдоль отрезка, а не весь
+        охватывающий его прямоугольник.
+        """
+        size = self.cell_size
+        (x1, y1), (x2, y2) = sorted((start_pos, end_pos))
+        slope = (y2 - y1) / (x2 - x1) if x2 != x1 else 0
+        found = set()
+        for cx in range(math.floor(x1) // size, (math.floor(x2) + width - 1) // size + 1):
+            # Часть отрезка, при которой курсор задевает столбец ячеек cx
+            left = max(x1, cx * size - width)
+            right = min(x2, (cx + 1) * size)
+            y_left = y1 + (left - x1) * slope
+            y_right = y1 + (right - x1) * slope if x2 != x1 else y2
+            top = math.floor(min(y_left, y_right))
+            bottom = math.floor(max(y_left, y_right)) + width
+            for cy in range(top // size, (bottom - 1) // size + 1):
+                indices = self.cells.get((cx, cy))
+                if indices:
+                    found.update(indices)
+        return [self.sprites[i] for i in sorted(found)]
+
+    def walk_segment(self, start_pos, end_pos, width=1):
+        """
+        Перебирает стены вдоль движения курсора размера width по отрезку от начала к концу.
+        Отрезок делится на участки: первый - в четверть ячейки, дальше каждый вдвое длиннее,
+        но не длиннее ячейки (на плотных уровнях касание обычно находится рядом с началом).
+        Для каждого участка возвращается (t, номера стен): t - момент конца участка (1 - конец
+        отрезка), номера - стены ячеек участка, не встречавшиеся раньше, по порядку.
+        Курсор, который не позже момента t касается стены, касается ее в одной из уже
+        перебранных ячеек.
+        """
+        size = self.cell_size
+        dx = end_pos[0] - start_pos[0]
+        dy = end_pos[1] - start_pos[1]
+        length = max(abs(dx), abs(dy))  # Длина отрезка по главной оси
+        seen = set()
+        x_prev, y_prev = start_pos
+        done, chunk = 0, size / 4
+        while True:
+            done = min(done + chunk, length)
+            chunk = min(chunk * 2, size)
+            t = done / length if length else 1
+            x = start_pos[0] + dx * t
+            y = start_pos[1] + dy * t
+            # Запас в пиксель на округление координат точек поточечной проверки
+            x1, x2 = math.floor(min(x_prev, x)) - 1, math.floor(max(x_prev, x)) + width + 1
+            y1, y2 = math.floor(min(y_prev, y)) - 1, math.floor(max(y_prev, y)) + width + 1
+            found = []
+            for cell in self._cells_for(x1, y1, x2, y2):
+                indices = self.cells.get(cell)
+                if indices:
+                    for i in indices:
+                        if i not in seen:
+                            seen.add(i)
+                            found.append(i)
+            found.sort()
+            yield t, found
+            if t >= 1:
+                return
+            x_prev, y_prev = x, y
+
+
+# Поточечная проверка столкновений (эталон для сравнения с аналитической)
+def step_line_and_check_collision(start_pos, end_pos, sprites, width = 1, index=None):
     """
-    Рисует линию между start_pos и end_pos и проверяет столкновения с спрайтами.
+    Проходит линию между start_pos и end_pos по одному пикселю и проверяет столкновения с спрайтами.
+    Если передан пространственный индекс index (UniformGrid), проверяются только
+    стены рядом с отрезком, а sprites не используется.
     Возвращает словарь с информацией о столкновении, если оно произошло, иначе None.
     Словарь содержит:
         - 'sprite': Спрайт, с которым произошло столкновение.
         - 'side': Сторона столкновения ("top", "bottom", "left", "right").
         - 'position_before': Координаты (x, y) точки на линии непосредственно перед столкновением.
     """
+    if index is not None:
+        sprites = index.query_segment(start_pos, end_pos, width)
+        if not sprites:
+            return None
 
     dx = end_pos[0] - start_pos[0]
     dy = end_pos[1] - start_pos[1]
@@ -95,3 +267,496 @@ def draw_line_and_check_collision(start_pos, end_pos, sprites, width = 1):
                 }
 
     return None
+
+
+def _get_slab(start, delta, low, high):
+    """
+    Метод плит для одной оси: возвращает интервал времени (t_enter, t_exit),
+    когда координата start + delta * t лежит в [low, high), или None.
+    """
+    if delta == 0:
+        if low <= start < high:
+            return -math.inf, math.inf
+        return None
+    t1 = (low - start) / delta
+    t2 = (high - start) / delta
+    return (t1, t2) if t1 < t2 else (t2, t1)
+
+
+def _sample_point(start_pos, dx, dy, num_steps, i):
+    """
+    Точка i-го шага на отрезке, округленная так же, как при поточечной проверке.
+    """
+    return int(start_pos[0] + dx * i / num_steps), int(start_pos[1] + dy * i / num_steps)
+
+
+def _axis_steps(start, delta, num_steps, low, high):
+    """
+    Шаги i из [0, num_steps], на которых координата точки поточечной проверки
+    int(start + delta * i / num_steps) лежит строго между low и high: (первый, последний) или None.
+    Границы находятся из уравнения прямой; погрешность деления сдвигает их не больше
+    чем на шаг, это исправляется проверкой соседнего шага.
+    """
+    def inside(i):
+        return low < int(start + delta * i / num_steps) < high
+
+    if delta == 0:
+        return (0, num_steps) if inside(0) else None
+    # int() округляет к нулю: int(x) > low при x >= low + 1 (low >= 0) или x > low (low < 0),
+    # int(x) < high при x < high (high > 0) или x <= high - 1 (high <= 0)
+    lower = low + 1 if low >= 0 else low
+    upper = high if high > 0 else high - 1
+    t1 = (lower - start) / delta * num_steps
+    t2 = (upper - start) / delta * num_steps
+    if t1 > t2:
+        t1, t2 = t2, t1
+    first = max(math.ceil(t1), 0)
+    last = min(math.floor(t2), num_steps)
+    if first > num_steps or last < 0:
+        return None
+    if not inside(first):
+        first += 1
+    elif first > 0 and inside(first - 1):
+        first -= 1
+    if not inside(last):
+        last -= 1
+    elif last < num_steps and inside(last + 1):
+        last += 1
+    if first > last or not inside(first):
+        return None
+    return first, last
+
+
+def _get_contact(start_pos, end_pos, rect, width):
+    """
+    Находит первый шаг вдоль отрезка, на котором курсор размера width касается rect.
+
+    Время входа в расширенный прямоугольник считается методом плит, а шаг касания -
+    по целым точкам каждой оси (_axis_steps), чтобы совпадать с поточечной проверкой.
+    Возвращает None или кортеж (step, num_steps, inside, side), где inside = False
+    означает, что отрезок срезает угол стены между соседними шагами.
+    """
+    if rect.width <= 0 or rect.height <= 0:
+        return None
+
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    # Целая точка (x, y) пересекается с rect при rect.left - width < x < rect.right,
+    # а вещественная координата округляется вниз, отсюда границы плит.
+    slab_x = _get_slab(start_pos[0], dx, rect.left - width + 1, rect.right)
+    if slab_x is None:
+        return None
+    slab_y = _get_slab(start_pos[1], dy, rect.top - width + 1, rect.bottom)
+    if slab_y is None:
+        return None
+
+    t_enter = max(slab_x[0], slab_y[0])
+    t_exit = min(slab_x[1], slab_y[1])
+    if t_enter > t_exit or t_enter > 1 or t_exit < 0:
+        return None
+
+    distance = math.sqrt(dx**2 + dy**2)
+    num_steps = int(distance) if distance != 0 else 1
+    # Шаги, на которых точка поточечной проверки касается rect, по каждой оси - интервал,
+    # их пересечение - шаги касания по обеим осям сразу
+    steps_x = _axis_steps(start_pos[0], dx, num_steps, rect.left - width, rect.right)
+    steps_y = _axis_steps(start_pos[1], dy, num_steps, rect.top - width, rect.bottom)
+    inside = False
+    if steps_x is not None and steps_y is not None:
+        step = max(steps_x[0], steps_y[0])
+        inside = step <= min(steps_x[1], steps_y[1])
+    if not inside:
+        if max(t_enter, 0) >= min(t_exit, 1):
+            return None  # Отрезок лишь коснулся границы
+        step = 0 if t_enter <= 0 else min(math.ceil(t_enter * num_steps), num_steps)
+
+    if slab_x[0] > slab_y[0]:
+        side = 'left' if dx > 0 else 'right'
+    else:
+        side = 'top' if dy > 0 else 'bottom'
+    return step, num_steps, inside, side
+
+
+def sweep_rect(start_pos, end_pos, rect, width=1):
+    """
+    Аналитически находит столкновение курсора размера width, движущегося от start_pos
+    к end_pos, с прямоугольником rect (метод плит для расширенного прямоугольника).
+
+    Возвращает None, если столкновения нет, иначе кортеж (step, side, position_before):
+        - step: номер шага вдоль отрезка (как при поточечной проверке), на котором курсор касается rect;
+        - side: сторона столкновения ("top", "bottom", "left", "right");
+        - position_before: координаты (x, y) непосредственно перед столкновением.
+    """
+    contact = _get_contact(start_pos, end_pos, rect, width)
+    if contact is None:
+        return None
+    step, num_steps, inside, side = contact
+
+    if step == 0:
+        # Курсор уже касается стены в начале отрезка
+        cursor_rect = pygame.Rect(int(start_pos[0]), int(start_pos[1]), width, width)
+        return 0, get_collision_side(cursor_rect, rect), start_pos
+
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    if not inside:
+        return step, side, _sample_point(start_pos, dx, dy, num_steps, step - 1)
+
+    # Позиция перед столкновением ищется на отрезке от начала до точки касания,
+    # как это делает get_position_before_collision, но без перебора шагов.
+    hit_pos = _sample_point(start_pos, dx, dy, num_steps, step)
+    sub_step, sub_steps, _, _ = _get_contact(start_pos, hit_pos, rect, width)
+    if sub_step == 0:
+        return step, side, start_pos
+    sub_dx = hit_pos[0] - start_pos[0]
+    sub_dy = hit_pos[1] - start_pos[1]
+    return step, side, _sample_point(start_pos, sub_dx, sub_dy, sub_steps, sub_step - 1)
+
+
+# Функция для рисования линии и проверки столкновений
+def draw_line_and_check_collision(start_pos, end_pos, sprites, width = 1, index=None):
+    """
+    Проверяет столкновения курсора, движущегося по линии от start_pos к end_pos, со спрайтами.
+    Время касания находится аналитически для каждой стены (sweep_rect), без перебора пикселей.
+    Если передан пространственный индекс index (UniformGrid), стены перебираются по ячейкам
+    вдоль отрезка до первого касания, а sprites не используется.
+    Возвращает словарь с информацией о столкновении, если оно произошло, иначе None.
+    Словарь содержит:
+        - 'sprite': Спрайт, с которым произошло столкновение.
+        - 'side': Сторона столкновения ("top", "bottom", "left", "right").
+        - 'position_before': Координаты (x, y) точки на линии непосредственно перед столкновением.
+    """
+    if index is not None:
+        return _walk_first_contact(start_pos, end_pos, index, width)
+
+    # Быстрый отсев по времени входа в стену, затем точный шаг касания
+    # только для стен, которые могут оказаться первыми.
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    candidates = []
+    for order, sprite in enumerate(sprites):
+        rect = sprite.rect
+        slab_x = _get_slab(start_pos[0], dx, rect.left - width + 1, rect.right)
+        if slab_x is None or slab_x[0] > 1 or slab_x[1] < 0:
+            continue
+        slab_y = _get_slab(start_pos[1], dy, rect.top - width + 1, rect.bottom)
+        if slab_y is None:
+            continue
+        t_enter = max(slab_x[0], slab_y[0])
+        if t_enter <= min(slab_x[1], slab_y[1]) and t_enter <= 1 and slab_y[1] >= 0:
+            candidates.append((t_enter, order, sprite))
+    return _resolve_first_contact(start_pos, end_pos, candidates, width)
+
+
+def _resolve_first_contact(start_pos, end_pos, candidates, width):
+    """
+    Выбирает из кандидатов (t_enter, порядковый номер, спрайт) стену, которой курсор
+    коснется первой, и возвращает словарь со столкновением или None.
+    """
+    candidates.sort(key=lambda item: item[:2])
+
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    distance = math.sqrt(dx**2 + dy**2)
+    num_steps = int(distance) if distance != 0 else 1
+    best = None
+    best_sprite = None
+    for t_enter, order, sprite in candidates:
+        if best is not None and t_enter * num_steps > best[0] + 2:
+            break  # Остальные стены касаются курсора позже
+        contact = _get_contact(start_pos, end_pos, sprite.rect, width)
+        # При касании нескольких стен на одном шаге побеждает первая по порядку
+        if contact and (best is None or (contact[0], order) < best):
+            best, best_sprite = (contact[0], order), sprite
+
+    return _get_collision_info(start_pos, end_pos, best_sprite, width)
+
+
+def _walk_first_contact(start_pos, end_pos, index, width):
+    """
+    Первое касание стен из index (UniformGrid) при движении курсора по отрезку. Ячейки
+    перебираются по порядку вдоль отрезка (UniformGrid.walk_segment), стены - по времени
+    входа (метод плит), и точный шаг касания (_get_contact) считается только для стен,
+    которые могут оказаться первыми. Перебор заканчивается, как только найденное касание
+    наступает не позже конца пройденного участка - дальние стены коснуться раньше не могут.
+    """
+    # Курсор уже касается стены в начале отрезка: первая по порядку такая стена - в ячейках точки
+    cursor_rect = pygame.Rect(int(start_pos[0]), int(start_pos[1]), width, width)
+    for sprite in index.query(cursor_rect):
+        if cursor_rect.colliderect(sprite.rect):
+            return _get_collision_info(start_pos, end_pos, sprite, width)
+
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    distance = math.sqrt(dx**2 + dy**2)
+    num_steps = int(distance) if distance != 0 else 1
+    pending = []  # Куча (t_enter, номер, спрайт) еще не проверенных точно стен
+    best = None
+    best_sprite = None
+    for t, indices in index.walk_segment(start_pos, end_pos, width):
+        for i in indices:
+            sprite = index.sprites[i]
+            rect = sprite.rect
+            slab_x = _get_slab(start_pos[0], dx, rect.left - width + 1, rect.right)
+            if slab_x is None or slab_x[0] > 1 or slab_x[1] < 0:
+                continue
+            slab_y = _get_slab(start_pos[1], dy, rect.top - width + 1, rect.bottom)
+            if slab_y is None:
+                continue
+            t_enter = max(slab_x[0], slab_y[0])
+            if t_enter <= min(slab_x[1], slab_y[1]) and t_enter <= 1 and slab_y[1] >= 0:
+                heapq.heappush(pending, (t_enter, i, sprite))
+        # Стены, в которые курсор входит до конца участка, проверяются точно
+        while pending and pending[0][0] <= t:
+            if best is not None and pending[0][0] * num_steps > best[0] + 2:
+                break
+            _, i, sprite = heapq.heappop(pending)
+            contact = _get_contact(start_pos, end_pos, sprite.rect, width)
+            # При касании нескольких стен на одном шаге побеждает первая по порядку
+            if contact and (best is None or (contact[0], i) < best):
+                best, best_sprite = (contact[0], i), sprite
+        # Шаг best[0] приходится на момент best[0] / num_steps
+        if best is not None and best[0] <= t * num_steps:
+            break
+    # Шаг касания может отличаться от времени входа на пару шагов из-за округления точек
+    while pending and (best is None or pending[0][0] * num_steps <= best[0] + 2):
+        _, i, sprite = heapq.heappop(pending)
+        contact = _get_contact(start_pos, end_pos, sprite.rect, width)
+        if contact and (best is None or (contact[0], i) < best):
+            best, best_sprite = (contact[0], i), sprite
+    return _get_collision_info(start_pos, end_pos, best_sprite, width)
+
+
+def _get_collision_info(start_pos, end_pos, sprite, width):
+    """
+    Словарь со столкновением с sprite (см. draw_line_and_check_collision) или None, если sprite - None.
+    """
+    if sprite is None:
+        return None
+    _, side, position_before = sweep_rect(start_pos, end_pos, sprite.rect, width)
+    return {
+        'sprite': sprite,
+        'side': side,
+        'position_before': position_before
+    }
+
+
+class WallArrays:
+    """
+    Стены уровня, упакованные в непрерывные массивы numpy: x1, y1, x2, y2 и kind
+    (номер класса спрайта в self.kinds). Строятся один раз при загрузке уровня
+    и позволяют проверить отрезок сразу против всех стен.
+    """
+    def __init__(self, sprites=()):
+        self.sprites = list(sprites)
+        self.kinds = []
+        kinds = []
+        for sprite in self.sprites:
+            if type(sprite) not in self.kinds:
+                self.kinds.append(type(sprite))
+            kinds.append(self.kinds.index(type(sprite)))
+        rects = numpy.array([tuple(sprite.rect) for sprite in self.sprites], dtype=numpy.int32).reshape(-1, 4)
+        self.x1 = numpy.ascontiguousarray(rects[:, 0])
+        self.y1 = numpy.ascontiguousarray(rects[:, 1])
+        self.x2 = self.x1 + rects[:, 2]
+        self.y2 = self.y1 + rects[:, 3]
+        self.kind = numpy.array(kinds, dtype=numpy.uint8)
+        # Пустые прямоугольники ни с чем не сталкиваются
+        self.valid = (rects[:, 2] > 0) & (rects[:, 3] > 0)
+
+    def __len__(self):
+        return len(self.sprites)
+
+
+def _get_slabs(start, delta, low, high):
+    """
+    Метод плит для одной оси сразу для массива стен: возвращает массивы
+    времени входа и выхода (пустой интервал, если стена не задевается).
+    """
+    if delta == 0:
+        inside = (low <= start) & (start < high)
+        return numpy.where(inside, -numpy.inf, numpy.inf), numpy.where(inside, numpy.inf, -numpy.inf)
+    t1 = (low - start) / delta
+    t2 = (high - start) / delta
+    return numpy.minimum(t1, t2), numpy.maximum(t1, t2)
+
+
+def batch_check_collision(start_pos, end_pos, arrays, width=1):
+    """
+    Векторная версия draw_line_and_check_collision для уровней с большим числом стен.
+    Время входа курсора в каждую стену считается одной операцией над массивами WallArrays,
+    затем точный шаг касания уточняется только для самых ранних стен.
+    Возвращает тот же словарь, что и draw_line_and_check_collision, или None.
+    """
+    if not len(arrays):
+        return None
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    enter_x, exit_x = _get_slabs(start_pos[0], dx, arrays.x1 - width + 1, arrays.x2)
+    enter_y, exit_y = _get_slabs(start_pos[1], dy, arrays.y1 - width + 1, arrays.y2)
+    t_enter = numpy.maximum(enter_x, enter_y)
+    t_exit = numpy.minimum(exit_x, exit_y)
+    hit = arrays.valid & (t_enter <= t_exit) & (t_enter <= 1) & (t_exit >= 0)
+    indices = numpy.flatnonzero(hit)
+    candidates = [(t_enter[i], i, arrays.sprites[i]) for i in indices.tolist()]
+    return _resolve_first_contact(start_pos, end_pos, candidates, width)
+
+
+def check_path_collision(points, check):
+    """
+    Проверяет ломаную points (путь мыши за шаг) отрезок за отрезком функцией check(start, end),
+    например draw_line_and_check_collision с индексом. Возвращает первое столкновение или None.
+    """
+    for start_pos, end_pos in zip(points, points[1:]):
+        collision_info = check(start_pos, end_pos)
+        if collision_info:
+            return collision_info
+    return None
+
+
+def _get_path_slabs(start, delta, low, high):
+    """
+    Метод плит для одной оси сразу для всех отрезков ломаной (столбец start, delta)
+    и всех стен (строка low, high).
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t1 = (low - start) / delta
+        t2 = (high - start) / delta
+    still = delta == 0
+    inside = (low <= start) & (start < high)
+    enter = numpy.where(still, numpy.where(inside, -numpy.inf, numpy.inf), numpy.minimum(t1, t2))
+    exit_ = numpy.where(still, numpy.where(inside, numpy.inf, -numpy.inf), numpy.maximum(t1, t2))
+    return enter, exit_
+
+
+def batch_check_path(points, arrays, width=1):
+    """
+    Векторная проверка ломаной points: время входа курсора в каждую стену для всех отрезков
+    считается одной операцией над массивами (отрезки x стены), затем точный шаг касания
+    уточняется только для первого отрезка, который задевает стены.
+    Возвращает то же, что batch_check_collision для этого отрезка, или None.
+    """
+    if len(points) < 2 or not len(arrays):
+        return None
+    path = numpy.array(points, dtype=numpy.float64)
+    start = path[:-1]
+    delta = path[1:] - start
+    enter_x, exit_x = _get_path_slabs(start[:, :1], delta[:, :1], arrays.x1 - width + 1, arrays.x2)
+    enter_y, exit_y = _get_path_slabs(start[:, 1:], delta[:, 1:], arrays.y1 - width + 1, arrays.y2)
+    t_enter = numpy.maximum(enter_x, enter_y)
+    t_exit = numpy.minimum(exit_x, exit_y)
+    hit = arrays.valid & (t_enter <= t_exit) & (t_enter <= 1) & (t_exit >= 0)
+    for segment in numpy.flatnonzero(hit.any(axis=1)).tolist():
+        indices = numpy.flatnonzero(hit[segment])
+        candidates = [(t_enter[segment, i], i, arrays.sprites[i]) for i in indices.tolist()]
+        collision_info = _resolve_first_contact(points[segment], points[segment + 1], candidates, width)
+        if collision_info:
+            return collision_info
+    return None
+
+
+class OccupancyMap:
+    """
+    Стены уровня, растеризованные в попиксельные карты размера width x height (экран),
+    по байту на пиксель, строка за строкой:
+        - kind: 0 - пусто, иначе номер класса стены в self.kinds плюс 1 (Wall и RedWall различаются);
+          если стены перекрываются, в пикселе - первая по порядку, как при поточечной проверке;
+        - distance: нижняя оценка расстояния Чебышёва до ближайшего пикселя стены
+          (0 в стене, иначе 1, 2, 3, 5, 9, 17... - степени двойки плюс 1, меньше max_distance).
+    Строится один раз при загрузке уровня. Проверка отрезка повторяет поточечную
+    (step_line_and_check_collision) для курсора в один пиксель, но каждая точка - одно
+    обращение к карте, а по пустому месту точки пропускаются по карте расстояний.
+    Карты хранятся в bytes: по одному пикселю из них читается быстрее, чем из массива numpy,
+    а сами массивы после построения не нужны.
+    """
+    def __init__(self, sprites=(), width=800, height=600, max_distance=32):
+        self.sprites = list(sprites)
+        self.width, self.height = width, height
+        self.kinds = []
+        kind = numpy.zeros((height, width), dtype=numpy.uint8)
+        # В обратном порядке, чтобы в перекрытиях осталась первая по порядку стена
+        for sprite in reversed(self.sprites):
+            if type(sprite) not in self.kinds:
+                self.kinds.append(type(sprite))
+            rect = sprite.rect.clip((0, 0, width, height))
+            if rect.width > 0 and rect.height > 0:
+                kind[rect.top:rect.bottom, rect.left:rect.right] = self.kinds.index(type(sprite)) + 1
+
+        occupied = kind != 0
+        distance = numpy.ones((height, width), dtype=numpy.uint8)
+        distance[occupied] = 0
+        # reached - пиксели не дальше radius от стен. Расширение на shift по каждой оси
+        # (сдвигами на -shift, 0, +shift) дает область радиуса radius + shift без пропусков,
+        # пока shift не больше radius + 1, поэтому радиус удваивается за проход: 1, 2, 4, 8...
+        reached, radius, shift = occupied, 0, 1
+        while radius + shift < max_distance:
+            grown = reached.copy()
+            grown[shift:] |= reached[:-shift]
+            grown[:-shift] |= reached[shift:]
+            vertical = grown.copy()
+            grown[:, shift:] |= vertical[:, :-shift]
+            grown[:, :-shift] |= vertical[:, shift:]
+            reached, radius = grown, radius + shift
+            distance[~reached] = radius + 1
+            shift = radius
+        self.kind = kind.tobytes()
+        self.distance = distance.tobytes()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def nbytes(self):
+        return len(self.kind) + len(self.distance)
+
+    def wall_kind(self, x, y):
+        """
+        Класс стены в пикселе (x, y) или None.
+        """
+        kind = self.kind[y * self.width + x]
+        return self.kinds[kind - 1] if kind else None
+
+    def contains(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+
+def bitmap_check_collision(start_pos, end_pos, occupancy, index):
+    """
+    Поточечная проверка отрезка по OccupancyMap для курсора в один пиксель: тот же результат,
+    что у step_line_and_check_collision, но точка отрезка проверяется обращением к карте,
+    а точки, до которых стены заведомо не достать (по карте расстояний), пропускаются.
+    Класс стены в точке столкновения берется из карты, а сама стена - первая стена этого
+    класса в точке среди стен рядом из пространственного индекса index (UniformGrid):
+    карта хранит класс первой по порядку стены, поэтому это та же стена, что у поточечной проверки.
+    Отрезки за пределами карты проверяются поточечно через index.
+    """
+    if not (occupancy.contains(start_pos) and occupancy.contains(end_pos)):
+        return step_line_and_check_collision(start_pos, end_pos, None, index=index)
+
+    dx = end_pos[0] - start_pos[0]
+    dy = end_pos[1] - start_pos[1]
+    distance = math.sqrt(dx**2 + dy**2)
+    num_steps = int(distance) if distance != 0 else 1
+    # Наибольшее смещение по одной оси за шаг; после округления вниз точка сдвигается
+    # меньше чем на d пикселей, пока смещение меньше d - 1
+    step_length = max(abs(dx), abs(dy)) / num_steps
+    distances, row = occupancy.distance, occupancy.width
+    i = 0
+    while i <= num_steps:
+        x = int(start_pos[0] + dx * i / num_steps)
+        y = int(start_pos[1] + dy * i / num_steps)
+        d = distances[y * row + x]
+        if d == 0:
+            kind = occupancy.wall_kind(x, y)
+            temp_rect = pygame.Rect(x, y, 1, 1)
+            for sprite in index.query(temp_rect):
+                if type(sprite) is kind and temp_rect.colliderect(sprite.rect):
+                    return {
+                        'sprite': sprite,
+                        'side': get_collision_side(temp_rect, sprite.rect),
+                        'position_before': get_position_before_collision(start_pos, (x, y), sprite.rect),
+                    }
+        if step_length and d > 1:
+            i += max(math.ceil((d - 1) / step_length) - 1, 0) + 1
+        else:
+            i += 1
+    return None
@@ -0,0 +1,107 @@
+"""
+Планировщик кадров: симуляция с фиксированным шагом отдельно от отрисовки.
+
+Каждый кадр FrameScheduler.tick() говорит, сколько шагов симуляции нужно выполнить
+(по накопленному реальному времени), после чего кадр рисуется один раз. Так скорость
+анимации и таймера не зависит от FPS, а цикл не занимает ядро процессора целиком.
+"""
+import time
+
+# Режимы ожидания между кадрами
+CAP = 'cap'  # Отрисовка не чаще fps_cap кадров в секунду (0 - без ограничения)
+VSYNC = 'vsync'  # Ожидание выполняет pygame.display.flip() с вертикальной синхронизацией
+IDLE = 'idle'  # Сон до следующего шага симуляции: кадр рисуется только после нового шага
+
+
+class FrameScheduler:
+    """
+    Считает шаги симуляции с частотой step_rate и ограничивает частоту кадров.
+    Измеренное время кадра доступно в frame_time (секунды), сглаженный FPS - в fps.
+    """
+    def __init__(self, step_rate=60, fps_cap=0, mode=CAP, max_steps=5, clock=time.perf_counter, sleep=time.sleep):
+        self.step_time = 1 / step_rate
+        self.fps_cap = fps_cap
+        self.mode = mode
+        self.max_steps = max_steps  # Не догоняем больше шагов за кадр, чтобы не зависнуть после задержки
+        self.clock = clock
+        self.sleep = sleep
+        self.steps = 0  # Всего выполнено шагов симуляции
+        self.frame_time = 0.0
+        self.fps = 0.0
+        self.reset()
+
+    def reset(self):
+        """
+        Сбрасывает накопленное время, например после паузы, чтобы симуляция не догоняла ее.
+        """
+        self.last_time = self.clock()
+        self.next_frame = self.last_time
+        self.accumulator = 0.0
+
+    def time_to_next_step(self):
+        """
+        Секунд до следующего шага симуляции (0, если он уже должен быть выполнен).
+        """
+        return max(self.last_time + self.step_time - self.accumulator - self.clock(), 0.0)
+
+    def wait(self):
+        """
+        Спит до начала следующего кадра в зависимости от режима.
+        """
+        if self.mode == IDLE:
+            target = self.last_time + self.step_time - self.accumulator
+        elif self.mode == CAP and self.fps_cap:
+            target = self.next_frame
+        else:
+            return
+        delay = target - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def tick(self):
+        """
+        Начинает новый кадр: ждет, измеряет время кадра и возвращает количество шагов симуляции.
+        """
+        self.wait()
+        now = self.clock()
+        self.frame_time = now - self.last_time
+        self.last_time = now
+        if self.frame_time > 0:
+            fps = 1 / self.frame_time
+            self.fps = fps if not self.fps else self.fps * 0.9 + fps * 0.1
+        if self.mode == CAP and self.fps_cap:
+            period = 1 / self.fps_cap
+            self.next_frame = max(self.next_frame, now - period) + period
+
+        self.accumulator += self.frame_time
+        steps = int((self.accumulator + 1e-9) / self.step_time)
+        self.accumulator = max(self.accumulator - steps * self.step_time, 0.0)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        self.steps += steps
+        return steps
+
+
+class RunClock:
+    """
+    Время забега в секундах по монотонным часам clock без времени пауз.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.start = clock()
+        self.paused_at = None
+        self.paused_total = 0.0
+
+    def pause(self):
+        if self.paused_at is None:
+            self.paused_at = self.clock()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.paused_total += self.clock() - self.paused_at
+            self.paused_at = None
+
+    def elapsed(self):
+        now = self.paused_at if self.paused_at is not None else self.clock()
+        return now - self.start - self.paused_total
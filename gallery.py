@@ -0,0 +1,142 @@
+"""
+Галерея уровней без окна (видеодрайвер SDL dummy).
+
+Каждый уровень data/level*.csv загружается через main.Level, как в игре, рисуется
+на поверхность в памяти теми же спрайтами и уменьшается до миниатюры. Уровни
+обрабатываются параллельно в пуле процессов: разбор файла и отрисовка идут в Python,
+поэтому потоки упирались бы в GIL. Результат - миниатюры, общий лист со всеми
+уровнями и таблица: количество объектов, время загрузки и отрисовки каждого уровня.
+
+Запуск:
+    python gallery.py [--levels level1.csv ...] [--output gallery] [--width 200] [--columns 4]
+                      [--jobs N] [--json результат.json]
+--jobs 1 выполняет все в текущем процессе - для сравнения с параллельным режимом.
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import main
+import text_cache
+from level_cache import level_names
+
+THUMBNAIL_WIDTH = 200
+COLUMNS = 4
+MARGIN = 10
+LABEL_HEIGHT = 24
+
+
+def init_worker():
+    """
+    Настройка процесса пула: уровни не предзагружаются в фоне и не хранятся после отрисовки.
+    """
+    main.Level.prefetch = False
+    main.Level.built_levels_capacity = 0
+
+
+def render_level(file_name, width=THUMBNAIL_WIDTH):
+    """
+    Загружает и рисует уровень. Возвращает словарь со статистикой уровня и миниатюрой
+    в виде байтов RGB (поверхности pygame нельзя передать между процессами).
+    """
+    cursor = main.Cursor((main.WIDTH / 2, main.HEIGHT / 2), main.load_image('cursor.png'))
+    main.cursor = cursor
+    start = time.perf_counter()
+    level = main.Level([file_name])
+    loaded = time.perf_counter()
+
+    surface = pygame.Surface((main.WIDTH, main.HEIGHT))
+    surface.fill((255, 255, 255))
+    level.draw_objects(surface)
+    surface.blit(cursor.image, cursor.rect)
+    rendered = time.perf_counter()
+
+    height = round(main.HEIGHT * width / main.WIDTH)
+    thumbnail = pygame.transform.smoothscale(surface, (width, height))
+    main.Level.built_levels.clear()
+    return {
+        'level': file_name,
+        'walls': len(level.walls),
+        'sprites': len(level.sprites),
+        'objects': len(level.level_data['objects']),
+        'load_ms': (loaded - start) * 1000,
+        'render_ms': (rendered - loaded) * 1000,
+        'size': (width, height),
+        'thumbnail': pygame.image.tobytes(thumbnail, 'RGB'),
+    }
+
+
+def render_levels(levels, width=THUMBNAIL_WIDTH, jobs=None):
+    """
+    Рисует уровни в пуле из jobs процессов (None - по числу ядер, 1 - в текущем процессе).
+    Результаты возвращаются в порядке levels.
+    """
+    if jobs == 1:
+        init_worker()
+        return [render_level(file_name, width) for file_name in levels]
+    # spawn, а не fork: дочерний процесс не должен наследовать состояние SDL родителя
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(jobs, mp_context=context, initializer=init_worker) as executor:
+        return list(executor.map(render_level, levels, [width] * len(levels)))
+
+
+def contact_sheet(results, columns=COLUMNS):
+    """
+    Собирает миниатюры на один лист с подписями: имя уровня и количество объектов.
+    """
+    width, height = results[0]['size']
+    rows = (len(results) + columns - 1) // columns
+    cell_width, cell_height = width + MARGIN, height + LABEL_HEIGHT + MARGIN
+    sheet = pygame.Surface((columns * cell_width + MARGIN, rows * cell_height + MARGIN))
+    sheet.fill((230, 230, 230))
+    font = text_cache.get_font('Comic Sans MS', 14)
+    for i, result in enumerate(results):
+        x = MARGIN + i % columns * cell_width
+        y = MARGIN + i // columns * cell_height
+        sheet.blit(pygame.image.frombytes(result['thumbnail'], result['size'], 'RGB'), (x, y))
+        label = f"{result['level']}: {result['objects']} об."
+        sheet.blit(font.render(label, True, (0, 0, 0)), (x, y + height + 2))
+    return sheet
+
+
+def save_gallery(results, output, columns=COLUMNS):
+    os.makedirs(output, exist_ok=True)
+    for result in results:
+        thumbnail = pygame.image.frombytes(result['thumbnail'], result['size'], 'RGB')
+        pygame.image.save(thumbnail, os.path.join(output, result['level'][:-4] + '.png'))
+    pygame.image.save(contact_sheet(results, columns), os.path.join(output, 'contact_sheet.png'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Миниатюры всех уровней и время их загрузки.')
+    parser.add_argument('--levels', nargs='+')
+    parser.add_argument('--output', default='gallery', help='папка для миниатюр и общего листа')
+    parser.add_argument('--width', type=int, default=THUMBNAIL_WIDTH, help='ширина миниатюры')
+    parser.add_argument('--columns', type=int, default=COLUMNS)
+    parser.add_argument('--jobs', type=int, help='количество процессов (по умолчанию - по числу ядер)')
+    parser.add_argument('--json', help='сохранить таблицу в JSON')
+    args = parser.parse_args()
+
+    level_list = args.levels or level_names()
+    start = time.perf_counter()
+    level_results = render_levels(level_list, args.width, args.jobs)
+    elapsed = time.perf_counter() - start
+    save_gallery(level_results, args.output, args.columns)
+
+    print(f"{'уровень':<14}{'объектов':>10}{'стен':>8}{'загрузка, мс':>15}{'отрисовка, мс':>16}")
+    for result in level_results:
+        print(f"{result['level']:<14}{result['objects']:>10}{result['walls']:>8}"
+              f"{result['load_ms']:>15.2f}{result['render_ms']:>16.2f}")
+    print(f'Всего {len(level_results)} уровней за {elapsed:.2f} с, процессов: {args.jobs or os.cpu_count()}; '
+          f'миниатюры в {args.output}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            table = [{key: value for key, value in result.items() if key != 'thumbnail'} for result in level_results]
+            json.dump({'elapsed_s': elapsed, 'jobs': args.jobs or os.cpu_count(), 'levels': table}, f, indent=2)
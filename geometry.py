@@ -0,0 +1,107 @@
+"""
+Оптимизация геометрии уровня при загрузке.
+
+Сгенерированные уровни состоят из множества тонких полос, которые касаются
+или перекрывают друг друга. Здесь они объединяются в меньший набор
+непересекающихся прямоугольников той же формы, что уменьшает число проверок
+столкновений и отрисовок за кадр.
+"""
+
+# Объекты, которые можно объединять (стены разных типов не смешиваются)
+MERGEABLE_OBJECTS = ('wall', 'redwall')
+
+
+def merge_rects(rects):
+    """
+    Объединяет прямоугольники (x1, y1, x2, y2) в набор непересекающихся прямоугольников,
+    покрывающий в точности ту же область. Пустые прямоугольники отбрасываются.
+
+    Координаты сжимаются до уникальных значений, область закрашивается в сетке
+    сжатых ячеек, затем каждая строка разбивается на отрезки, а одинаковые отрезки
+    соседних строк склеиваются по вертикали.
+    """
+    rects = [(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)) for x1, y1, x2, y2 in rects]
+    rects = [rect for rect in rects if rect[0] < rect[2] and rect[1] < rect[3]]
+    if not rects:
+        return []
+
+    xs = sorted({x for rect in rects for x in (rect[0], rect[2])})
+    ys = sorted({y for rect in rects for y in (rect[1], rect[3])})
+    x_index = {x: i for i, x in enumerate(xs)}
+    y_index = {y: i for i, y in enumerate(ys)}
+
+    rows = [bytearray(len(xs) - 1) for _ in range(len(ys) - 1)]
+    for x1, y1, x2, y2 in rects:
+        i1, i2 = x_index[x1], x_index[x2]
+        fill = b'\x01' * (i2 - i1)
+        for j in range(y_index[y1], y_index[y2]):
+            rows[j][i1:i2] = fill
+
+    merged = []
+    active = {}  # (i1, i2) -> номер строки, с которой начался прямоугольник
+    for j, row in enumerate(rows + [bytearray(len(xs) - 1)]):
+        runs = set()
+        start = row.find(1)
+        while start != -1:
+            end = row.find(0, start)
+            if end == -1:
+                end = len(row)
+            runs.add((start, end))
+            start = row.find(1, end)
+        for run in list(active):
+            if run not in runs:
+                i1, i2 = run
+                merged.append((xs[i1], ys[active.pop(run)], xs[i2], ys[j]))
+        for run in runs:
+            active.setdefault(run, j)
+    merged.sort(key=lambda rect: (rect[1], rect[0]))
+    return merged
+
+
+def merge_walls(records, cache=None):
+    """
+    Объединяет стены в записях уровня (см. level_cache.parse_level).
+
+    Объединяются только идущие подряд стены одного типа, чтобы не менять порядок
+    отрисовки и приоритет столкновений между разными объектами; строки cursor
+    последовательность не прерывают. Возвращает новые записи и отчет
+    {тип: (было, стало)}.
+
+    cache - словарь для результатов объединения отдельных последовательностей стен:
+    при повторном вызове для измененного файла заново объединяются только
+    изменившиеся последовательности.
+    """
+    result = []
+    report = {}
+    run_obj, run = None, []
+
+    def flush():
+        if run:
+            # Если объединение не уменьшает количество стен (например, у пересекающихся
+            # стен, которые разрезаются на части), оставляем их как было
+            key = (run_obj, tuple(run))
+            merged = cache.get(key) if cache is not None else None
+            if merged is None:
+                merged = merge_rects(run)
+                if len(merged) >= len(run):
+                    merged = list(run)
+                if cache is not None:
+                    cache[key] = merged
+            before, after = report.get(run_obj, (0, 0))
+            report[run_obj] = (before + len(run), after + len(merged))
+            result.extend((run_obj, rect) for rect in merged)
+            run.clear()
+
+    for obj, data in records:
+        if obj == 'cursor':
+            result.append((obj, data))
+            continue
+        if obj != run_obj:
+            flush()
+            run_obj = obj
+        if obj in MERGEABLE_OBJECTS:
+            run.append(data)
+        else:
+            result.append((obj, data))
+    flush()
+    return result, report
@@ -0,0 +1,149 @@
+"""
+Запись и детерминированное воспроизведение игровой сессии.
+
+Лог - бинарный файл: заголовок (частота симуляции, начальная позиция мыши, список уровней)
+и записи фиксированного размера, привязанные к номеру шага симуляции:
+    - MOVE: новая позиция мыши (пишется, только если она отличается от ожидаемой); за один шаг
+      может быть несколько записей - промежуточные позиции из событий MOUSEMOTION;
+    - PAUSE: пауза;
+    - LEVEL: переход на следующий уровень (номер следующего уровня);
+    - TICK: таймер прибавил секунду (новое значение);
+    - END: конец сессии (последний шаг).
+Анимация финиша и таймер считают шаги симуляции, поэтому при воспроизведении тех же
+позиций мыши по тем же шагам сессия повторяется точно, независимо от FPS.
+
+Запись и воспроизведение:
+    python main.py --record session.rpl
+    python main.py --replay session.rpl [--fast]
+"""
+import struct
+
+MAGIC = b'RPLY'
+VERSION = 2
+# Заголовок: сигнатура, версия, шагов симуляции в секунду, начальная позиция мыши, количество уровней
+HEADER = struct.Struct('<4sHHiiH')
+NAME_LENGTH = struct.Struct('<H')
+# Запись: тип, номер шага симуляции и два параметра. Параметры - int32: в int16 не помещаются
+# значение таймера после 9 часов игры и координаты мыши за пределами ±32767
+RECORD = struct.Struct('<BIii')
+
+MOVE, PAUSE, LEVEL, TICK, END = range(5)
+
+
+class InputRecorder:
+    """
+    Записывает позиции мыши по шагам симуляции и события сессии в лог.
+    Используется вместо pygame.mouse (см. main.mouse): перенос мыши через set_pos
+    запоминается, чтобы в лог попадали только позиции, отличающиеся от ожидаемых.
+    """
+    def __init__(self, path, file_names, sim_rate, mouse):
+        self.mouse = mouse
+        self.pos = tuple(map(int, mouse.get_pos()))
+        self.step = 0
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, sim_rate, *self.pos, len(file_names)))
+        for name in file_names:
+            encoded = name.encode('utf-8')
+            self.file.write(NAME_LENGTH.pack(len(encoded)) + encoded)
+
+    def get_pos(self):
+        return self.mouse.get_pos()
+
+    def set_pos(self, pos):
+        self.mouse.set_pos(pos)
+        self.pos = tuple(map(int, pos))
+
+    def sample(self, step, motion=()):
+        """
+        Вызывается в начале шага симуляции: записывает промежуточные позиции мыши motion
+        (из событий MOUSEMOTION) и текущую позицию, пропуская повторы.
+        """
+        self.step = step
+        for pos in (*motion, self.mouse.get_pos()):
+            pos = tuple(map(int, pos))
+            if pos != self.pos:
+                self.pos = pos
+                self.write(MOVE, *pos)
+
+    def write(self, kind, a=0, b=0):
+        self.file.write(RECORD.pack(kind, self.step, a, b))
+
+    def close(self):
+        if not self.file.closed:
+            self.write(END)
+            self.file.close()
+
+
+class InputReplay:
+    """
+    Воспроизводит лог: подставляет записанные позиции мыши по шагам симуляции
+    и возвращает записанные события для сверки с тем, что произошло при воспроизведении.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, self.sim_rate, x, y, names_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: не является логом сессии версии {VERSION}')
+        offset = HEADER.size
+        self.file_names = []
+        for _ in range(names_count):
+            (length,) = NAME_LENGTH.unpack_from(data, offset)
+            offset += NAME_LENGTH.size
+            self.file_names.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        body = memoryview(data)[offset:offset + (len(data) - offset) // RECORD.size * RECORD.size]
+        self.records = list(RECORD.iter_unpack(body))
+        self.end_step = self.records[-1][1] if self.records and self.records[-1][0] == END else None
+        self.start_pos = (x, y)
+        self.rewind()
+
+    def rewind(self):
+        self.pos = self.start_pos
+        self.index = 0
+        self.path = []  # Позиции мыши последнего шага из advance()
+
+    def get_pos(self):
+        return self.pos
+
+    def set_pos(self, pos):
+        self.pos = tuple(map(int, pos))
+
+    def advance(self, step):
+        """
+        Применяет записи шага step: позиция мыши меняется (все позиции шага по порядку - в path),
+        остальные события возвращаются списком [(тип, a, b), ...].
+        """
+        events = []
+        self.path = []
+        while self.index < len(self.records) and self.records[self.index][1] <= step:
+            kind, _, a, b = self.records[self.index]
+            self.index += 1
+            if kind == MOVE:
+                self.pos = (a, b)
+                self.path.append(self.pos)
+            elif kind != END:
+                events.append((kind, a, b))
+        return events
+
+    def finished(self, step):
+        """
+        Лог закончился: все записи применены и шаг step уже за последним записанным.
+        """
+        if self.end_step is not None:
+            return step > self.end_step
+        return self.index >= len(self.records)
+
+    def positions(self):
+        """
+        Позиции мыши по всем шагам сессии (без учета переносов курсора), например для бенчмарка.
+        """
+        self.rewind()
+        result = []
+        step = 0
+        while not self.finished(step):
+            self.advance(step)
+            result.append(self.pos)
+            step += 1
+        self.rewind()
+        return result
@@ -0,0 +1,239 @@
+"""
+Бинарный кэш уровней.
+
+При первой загрузке data/levelN.csv разбирается и сохраняется в data/__cache__/levelN.csv.bin
+в виде упакованных записей фиксированного размера. Пока CSV не изменился (совпадают
+время изменения и размер, либо хэш содержимого), уровень читается из кэша без разбора строк.
+
+Предварительная компиляция всех уровней:
+    python -m level_cache [папка_с_уровнями]
+"""
+import os
+import sys
+import time
+import struct
+import hashlib
+import tempfile
+
+CACHE_DIR_NAME = '__cache__'
+MAGIC = b'LVLC'
+VERSION = 1
+# Заголовок: сигнатура, версия, mtime_ns и размер исходного CSV, sha1 содержимого,
+# количество строк в таблице строк и количество записей
+HEADER = struct.Struct('<4sHqq20sII')
+# Запись: номер имени объекта в таблице строк и до четырех целых параметров
+RECORD = struct.Struct('<H4i')
+STRING_LENGTH = struct.Struct('<H')
+
+
+def get_cache_path(path):
+    """
+    Возвращает путь к бинарному кэшу для файла уровня.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIR_NAME, name + '.bin')
+
+
+def parse_level(path):
+    """
+    Разбирает CSV уровня в список записей (объект, параметры):
+        - ('cursor', (x, y))
+        - ('image', (имя_файла, x, y))
+        - (объект, (x1, y1, x2, y2)) для стен, финиша и других прямоугольных объектов.
+    Строки с ошибками пропускаются с сообщением, как и раньше при загрузке уровня;
+    неизвестные объекты проверяются уже при создании уровня.
+    """
+    with open(path, 'r') as f:
+        return parse_lines(f.readlines())
+
+
+def parse_lines(lines):
+    """
+    Разбирает строки CSV уровня, см. parse_level.
+    """
+    records = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('#') or not line:
+            continue
+        try:
+            obj, *data = line.split(';')
+            if obj == 'cursor':
+                records.append((obj, (int(data[0]), int(data[1]))))
+            elif obj == 'image':
+                x, y = map(int, data[1:3])
+                records.append((obj, (data[0], x, y)))
+            else:
+                x1, y1, x2, y2 = map(int, data)
+                records.append((obj, (x1, y1, x2, y2)))
+        except (ValueError, IndexError):
+            print('error when loading line:', line, '. skipping.')
+    return records
+
+
+def pack_records(records, source_stat, source_hash):
+    """
+    Упаковывает записи уровня в байты бинарного кэша.
+    """
+    strings = []
+    string_ids = {}
+
+    def string_id(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    body = bytearray()
+    for obj, args in records:
+        if obj == 'image':
+            args = (string_id(args[0]), *args[1:])
+        args = tuple(args) + (0,) * (4 - len(args))
+        body += RECORD.pack(string_id(obj), *args)
+
+    table = bytearray()
+    for value in strings:
+        encoded = value.encode('utf-8')
+        table += STRING_LENGTH.pack(len(encoded)) + encoded
+
+    header = HEADER.pack(MAGIC, VERSION, source_stat.st_mtime_ns, source_stat.st_size,
+                         source_hash, len(strings), len(records))
+    return bytes(header + table + body)
+
+
+def unpack_records(data):
+    """
+    Распаковывает записи из байтов бинарного кэша (без заголовка-проверки свежести).
+    Возвращает None, если размер данных не совпадает с заголовком (файл обрезан или испорчен).
+    """
+    _, _, _, _, _, strings_count, records_count = HEADER.unpack_from(data)
+    offset = HEADER.size
+    strings = []
+    for _ in range(strings_count):
+        (length,) = STRING_LENGTH.unpack_from(data, offset)
+        offset += STRING_LENGTH.size
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    if len(data) != offset + records_count * RECORD.size:
+        return None
+    records = []
+    body = memoryview(data)[offset:]
+    for name_id, a, b, c, d in RECORD.iter_unpack(body):
+        obj = strings[name_id]
+        if obj == 'cursor':
+            records.append((obj, (a, b)))
+        elif obj == 'image':
+            records.append((obj, (strings[a], b, c)))
+        else:
+            records.append((obj, (a, b, c, d)))
+    return records
+
+
+def read_cache(path, source_stat):
+    """
+    Читает кэш уровня, если он соответствует текущему CSV. Иначе возвращает None.
+    """
+    try:
+        with open(get_cache_path(path), 'rb') as f:
+            data = f.read()
+        magic, version, mtime_ns, size, source_hash, strings_count, records_count = HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC or version != VERSION or size != source_stat.st_size:
+        return None
+    if mtime_ns != source_stat.st_mtime_ns:
+        # Файл мог быть перезаписан без изменений (например, git checkout), сверяем хэш
+        with open(path, 'rb') as f:
+            if hashlib.sha1(f.read()).digest() != source_hash:
+                return None
+    try:
+        records = unpack_records(data)
+    except (struct.error, IndexError, UnicodeDecodeError):
+        return None
+    if records is not None and mtime_ns != source_stat.st_mtime_ns:
+        # Содержимое то же: запоминаем новое время изменения, чтобы не считать хэш при каждой загрузке
+        header = HEADER.pack(magic, version, source_stat.st_mtime_ns, size, source_hash,
+                             strings_count, records_count)
+        write_file(get_cache_path(path), header + data[HEADER.size:])
+    return records
+
+
+def write_cache(path, records, source_stat, source_hash):
+    """
+    Сохраняет кэш уровня. Уровень, который не помещается в формат кэша (координаты
+    за пределами int32, больше 65535 разных строк или строка длиннее 65535 байт),
+    не кэшируется.
+    """
+    try:
+        data = pack_records(records, source_stat, source_hash)
+    except struct.error:
+        return
+    write_file(get_cache_path(path), data)
+
+
+def write_file(cache_path, data):
+    """
+    Записывает файл кэша атомарно: сначала во временный файл, затем замена.
+    Временный файл у каждой записи свой: один уровень могут одновременно компилировать
+    несколько потоков (предзагрузка картинок, предзагрузка следующего уровня и основной поток).
+    """
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Кэш не обязателен, например, если папка только для чтения
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_records(path):
+    """
+    Возвращает записи уровня: из бинарного кэша, если он свежий, иначе разбирает CSV
+    и обновляет кэш.
+    """
+    source_stat = os.stat(path)
+    records = read_cache(path, source_stat)
+    if records is None:
+        records = compile_level(path)
+    return records
+
+
+def compile_level(path):
+    """
+    Разбирает CSV уровня, сохраняет бинарный кэш и возвращает записи.
+    """
+    source_stat = os.stat(path)
+    with open(path, 'rb') as f:
+        source = f.read()
+    records = parse_lines(source.decode().splitlines())
+    write_cache(path, records, source_stat, hashlib.sha1(source).digest())
+    return records
+
+
+def level_names(directory='data'):
+    """
+    Файлы уровней levelN.csv из папки directory по порядку номеров.
+    """
+    names = [name for name in os.listdir(directory) if name.startswith('level') and name.endswith('.csv')]
+    return sorted(names, key=lambda x: int(x[5:-4]))  # Обрезаем "level" и ".csv" и преобразуем в int
+
+
+def compile_levels(directory='data'):
+    """
+    Компилирует все data/level*.csv в бинарный кэш и печатает статистику.
+    """
+    for name in level_names(directory):
+        path = os.path.join(directory, name)
+        start = time.perf_counter()
+        records = compile_level(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f'{name}: объектов {len(records)}, {elapsed:.1f} мс -> {get_cache_path(path)}')
+
+
+if __name__ == '__main__':
+    compile_levels(sys.argv[1] if len(sys.argv) > 1 else 'data')
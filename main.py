@@ -1,14 +1,62 @@
 import os
 import sys
+import time
 import pygame
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import assets
 import collisions
+import frame_scheduler
+import geometry
+import input_log
+import level_cache
+import profiling
+import records
+import text_cache
+import walls
+
+try:
+    import numpy
+except ImportError:  # numpy необязателен, без него шахматная доска финиша рисуется на чистом pygame
+    numpy = None
 
 pygame.init()
 
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
+# Режим грязных прямоугольников: на экран выводятся только изменившиеся области
+# (курсор, таймер, финиш, кнопки) вместо полного pygame.display.flip() каждый кадр
+DIRTY_RECTS = False
+# Шагов симуляции в секунду: курсор, анимация финиша (один кадр анимации за шаг) и таймер
+SIM_RATE = 60
+# Ограничение FPS отрисовки (0 - без ограничения) и режим ожидания кадра: 'cap', 'vsync' или 'idle'.
+# Интерполяции между шагами нет, курсор сдвигается только на шаге симуляции, поэтому
+# кадры чаще SIM_RATE повторяли бы ту же картинку
+FPS_CAP = SIM_RATE
+FRAME_MODE = frame_scheduler.CAP
+if FRAME_MODE == frame_scheduler.VSYNC:
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED, vsync=1)
+else:
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption('Лабиринт в курсоре')
 clock = pygame.time.Clock()
+# Источник позиции мыши в игре: pygame.mouse, а при записи и воспроизведении сессии -
+# input_log.InputRecorder или input_log.InputReplay с теми же get_pos() и set_pos()
+mouse = pygame.mouse
+# Изображения загружаются один раз и дальше берутся из кэша (см. load_image)
+images = assets.AssetCache('data')
+# Шрифт надписей игры и размеры, в которых он используется (шрифты ищутся один раз при запуске)
+FONT_NAME = 'Comic Sans MS'
+FONTS = ((FONT_NAME, 30), (FONT_NAME, 20))
+# Изображения меню и курсора, которые предзагружаются при запуске вместе с картинками уровней
+UI_IMAGES = (
+    'cursor.png', 'start_window.png', 'rules_window.png', 'pause_window.png', 'end_window.png',
+    'play_button_default.png', 'play_button_active.png', 'rules_button_default.png',
+    'rules_button_active.png', 'back_button_default.png', 'back_button_active.png',
+)
+# Замеры фаз кадра и оверлей с ними (F3), запись cProfile (F4), см. profiling
+profiler = profiling.FrameProfiler()
+# Результаты забегов: общее время и время прохождения каждого уровня, см. records
+records_store = records.RecordStore(os.path.join('data', 'records.sqlite3'))
 
 
 class GUIButton(pygame.sprite.Sprite):
@@ -55,7 +103,7 @@ class Image(pygame.sprite.Sprite):
         """
         Обновляет изображение, если есть активное изображение и курсор над ним.
         """
-        x, y = pygame.mouse.get_pos()
+        x, y = mouse.get_pos()
         if self.image_active:
             if self.rect.collidepoint(x, y):
                 self.image = self.image_active
@@ -67,6 +115,15 @@ class Cursor(pygame.sprite.Sprite):
     """
     Класс для управления курсором, его движением и столкновениями.
     """
+    # Способ проверки столкновений: 'auto' (numpy для длинных отрезков на уровнях с множеством стен,
+    # иначе сетка, см. collisions.BATCH_THRESHOLD), 'grid' (аналитически через UniformGrid),
+    # 'numpy' (WallArrays), 'stepping' (по пикселям, эталон)
+    # или 'bitmap' (те же пиксели по растровой карте стен collisions.OccupancyMap, нужен numpy)
+    collision_backend = 'auto'
+    # Сколько отрезков пути мыши за шаг проверяется самое большее: если событий MOUSEMOTION
+    # больше, их позиции прореживаются равномерно (первая и последняя точки остаются)
+    motion_samples = 32
+
     def __init__(self, pos, image, level_objects=None, *groups):
         super().__init__(*groups)
         self.image = image
@@ -75,6 +132,7 @@ class Cursor(pygame.sprite.Sprite):
         self.level_objects = level_objects
         self.load_objects(self.level_objects)
         self.prev_pos = pos
+        self.motion = []  # Позиции мыши из событий MOUSEMOTION с прошлого шага симуляции
 
     def update(self, pos=None):
         """
@@ -83,19 +141,70 @@ class Cursor(pygame.sprite.Sprite):
         if pos:
             self.prev_pos = pos
             self.rect.topleft = pos
+            self.motion.clear()
             return
 
-        x, y = pygame.mouse.get_pos()  # Получаем текущую позицию мыши
-        current_pos = (x, y)
+        self.move(mouse.get_pos())  # Перемещаем к текущей позиции мыши
+
+    def add_motion(self, pos):
+        """
+        Запоминает позицию мыши из события MOUSEMOTION: на следующем шаге курсор пройдет
+        через нее, а не по прямой к текущей позиции мыши.
+        """
+        self.motion.append(pos)
 
+    def warp(self, pos):
+        """
+        Переносит мышь в pos (смена уровня, перезапуск, столкновение). События MOUSEMOTION,
+        пришедшие до переноса, еще лежат в очереди и на следующем шаге повели бы курсор
+        от новой позиции обратно к старой, поэтому они отбрасываются вместе с накопленными.
+        При записи сессии в лог попадает только то, что дошло до self.motion, поэтому
+        воспроизведение повторяет тот же путь.
+        """
+        mouse.set_pos(pos)
+        pygame.event.clear(pygame.MOUSEMOTION)
+        self.motion.clear()
+
+    def get_path(self, current_pos):
+        """
+        Путь мыши за шаг: prev_pos, позиции из событий MOUSEMOTION и current_pos без повторов,
+        не больше motion_samples отрезков. Накопленные позиции сбрасываются.
+        """
+        path = [self.prev_pos]
+        for pos in (*self.motion, current_pos):
+            pos = tuple(pos)
+            if pos != path[-1]:
+                path.append(pos)
+        self.motion.clear()
+        if len(path) == 1:
+            path.append(path[0])  # Курсор стоит на месте, но касание стены в этой точке все равно проверяется
+        elif len(path) - 1 > self.motion_samples:
+            last = len(path) - 1
+            path = [path[round(i * last / self.motion_samples)] for i in range(self.motion_samples + 1)]
+        return path
+
+    def move(self, current_pos):
+        """
+        Перемещает курсор к позиции current_pos с учетом столкновений с объектами уровня.
+        Столкновения проверяются вдоль всего пути мыши за шаг (см. get_path), поэтому
+        результат не зависит от того, сколько событий мыши пришлось на один кадр.
+        """
+        path = self.get_path(current_pos)
+        current_pos = path[-1]
         if self.level_objects:
-            collision_info = collisions.draw_line_and_check_collision(self.prev_pos, current_pos, self.level_objects)
+            if profiler.enabled:
+                start = profiler.clock()
+                collision_info = self.check_path(path)
+                profiler.add_collision(profiler.clock() - start)
+            else:
+                collision_info = self.check_path(path)
             if collision_info:
                 # Столкновение произошло!
                 self.rect.topleft = collision_info['position_before']  # Устанавливаем курсор в позицию перед столкновением
                 if type(collision_info['sprite']) is RedWall:
-                    self.rect.topleft = level.mouse_pos
-                pygame.mouse.set_pos(self.rect.topleft)
+                    level.reset()  # Начинаем уровень заново без перезагрузки
+                    return
+                self.warp(self.rect.topleft)
             else:
                 # Нет столкновений, перемещаем курсор в текущую позицию мыши.
                 self.rect.topleft = current_pos
@@ -105,68 +214,184 @@ class Cursor(pygame.sprite.Sprite):
 
         self.prev_pos = self.rect.topleft
 
-    def load_objects(self, objects):
-        if not objects:
-            self.level_objects = pygame.sprite.Group()
-            return
-        self.level_objects = pygame.sprite.Group(tuple(filter(lambda obj: obj.has_collision, objects)))
+    def check_path(self, path):
+        """
+        Проверяет столкновение на ломаной path: способом numpy - все отрезки одной операцией
+        над массивами стен, иначе - отрезок за отрезком через check_collision.
+        """
+        if len(path) == 2:
+            return self.check_collision(*path)
+        if self._resolve_backend() == 'numpy':
+            return collisions.batch_check_path(path, self.wall_arrays)
+        return collisions.check_path_collision(path, self.check_collision)
 
+    def check_collision(self, start_pos, end_pos):
+        """
+        Проверяет столкновение на отрезке способом из collision_backend.
+        """
+        length = max(abs(end_pos[0] - start_pos[0]), abs(end_pos[1] - start_pos[1]))
+        backend = self._resolve_backend(length)
+        if backend == 'numpy':
+            return collisions.batch_check_collision(start_pos, end_pos, self.wall_arrays)
+        if backend == 'bitmap':
+            return collisions.bitmap_check_collision(start_pos, end_pos, self.occupancy, self.collision_index)
+        if backend == 'stepping':
+            return collisions.step_line_and_check_collision(start_pos, end_pos, self.level_objects)
+        return collisions.draw_line_and_check_collision(start_pos, end_pos, self.level_objects,
+                                                        index=self.collision_index)
+
+    def _resolve_backend(self, length=0):
+        """
+        Способ проверки столкновений для текущего уровня: 'auto' заменяется на 'numpy'
+        (отрезок длиной length по главной оси не короче collisions.BATCH_MIN_LENGTH на уровне
+        с массивами стен) или 'grid', а нужные способу массивы стен или растровая карта
+        строятся при первом обращении и сохраняются в данных столкновений уровня (self.collision),
+        поэтому при повторном входе на уровень из built_levels не строятся заново.
+        """
+        backend = self.collision_backend
+        if backend == 'auto':
+            use_numpy = self.wall_arrays is not None and length >= collisions.BATCH_MIN_LENGTH
+            backend = 'numpy' if use_numpy else 'grid'
+        if backend == 'numpy' and self.wall_arrays is None:
+            self.wall_arrays = self.collision[2] = collisions.WallArrays(self.level_objects)
+        elif backend == 'bitmap' and self.occupancy is None:
+            self.occupancy = self.collision[3] = collisions.OccupancyMap(self.level_objects, WIDTH, HEIGHT)
+        return backend
+
+    def load_objects(self, objects, collision=None):
+        """
+        Загружает объекты уровня для проверки столкновений.
+        collision - заранее подготовленный результат build_collision(objects).
+        """
+        self.collision = collision or self.build_collision(objects)
+        self.level_objects, self.collision_index, self.wall_arrays, self.occupancy = self.collision
 
-class Wall(pygame.sprite.Sprite):
+    @staticmethod
+    def build_collision(objects):
+        """
+        Готовит хранилище стен со столкновениями, пространственный индекс, массивы для numpy
+        и, если выбран способ 'bitmap', растровую карту стен. Возвращает их списком: массивы
+        и карту, которые курсор построит позже, он допишет в этот же список.
+        objects - walls.WallStore уровня или любые объекты, из которых берутся объекты со столкновениями.
+        Не меняет состояние курсора, поэтому может выполняться в фоновом потоке.
+        """
+        if isinstance(objects, walls.WallStore):
+            level_objects = objects
+        else:
+            level_objects = walls.WallStore(filter(lambda obj: obj.has_collision, objects or ()))
+        # Пространственный индекс стен строится один раз на загрузку уровня
+        collision_index = collisions.UniformGrid(level_objects)
+        # На уровнях с множеством стен они упаковываются в массивы для векторной проверки
+        wall_arrays = None
+        if collisions.numpy is not None and len(level_objects) >= collisions.BATCH_THRESHOLD:
+            wall_arrays = collisions.WallArrays(level_objects)
+        occupancy = None
+        if Cursor.collision_backend == 'bitmap':
+            occupancy = collisions.OccupancyMap(level_objects, WIDTH, HEIGHT)
+        return [level_objects, collision_index, wall_arrays, occupancy]
+
+
+class Wall:
     """
     Класс для создания стен.
+    Стена - легкое представление прямоугольника из walls.WallStore уровня: без спрайта
+    и собственной поверхности, на фон рисуется заливкой цветом color.
     """
-    def __init__(self, pos, image=None, *groups):
-        super().__init__(*groups)
-        pos = correct_area_coords(pos)
-        if image:
-            self.image = image
-        else:
-            # print(pos)
-            self.image = pygame.Surface((pos[2] - pos[0], pos[3] - pos[1]))
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (pos[0], pos[1])
-        self.has_collision = True  # По умолчанию столкновения включены
+    __slots__ = ('rect',)
+    color = (0, 0, 0)
+    has_collision = True  # Со стенами всегда есть столкновения
+
+    def __init__(self, pos):
+        x1, y1, x2, y2 = correct_area_coords(pos)
+        self.rect = pygame.Rect(x1, y1, x2 - x1, y2 - y1)
+
+    @property
+    def image(self):
+        """
+        Изображение стены для совместимости со спрайтами, создается при каждом обращении.
+        """
+        image = pygame.Surface(self.rect.size)
+        image.fill(self.color)
+        return image
 
 
 class RedWall(Wall):
     """
     Класс для создания красных стен (специальный тип стен).
     """
-    def __init__(self, pos, *groups):
-        super().__init__(pos, *groups)
-        self.image.fill((255, 0, 0))
-        self.has_collision = True  # По умолчанию столкновения включены
+    __slots__ = ()
+    color = (255, 0, 0)
 
 
 class AnimatedFinish(pygame.sprite.Sprite):
     """
     Класс для создания анимированного финиша уровня.
+
+    Кадр анимации с прокруткой scroll_y - окно высотой height в полосе кадров: full_image,
+    поверх которого с высоты 2 * height - clip_height еще раз нарисовано его начало
+    (так продолжение прокрутки заходит снизу). Для каждой прокрутки заранее создается
+    subsurface полосы, поэтому шаг анимации только выбирает готовый кадр. Полоса и кадры
+    общие для финишей одного размера, их нельзя изменять.
     """
+    # (ширина, высота, clip_height, id изображения или None) -> (полоса, кадры по scroll_y)
+    strips = {}
+
     def __init__(self, pos, image=None, clip_height=10, speed=1, pause_duration=60, *groups):
         super().__init__(*groups)
         self.x1, self.y1, self.x2, self.y2 = correct_area_coords(pos)
         self.width, self.height = abs(self.x1 - self.x2), abs(self.y1 - self.y2)
         self.clip_height, self.speed, self.pause_duration = clip_height, speed, pause_duration
-        self.full_image = image if image else self.checkerboard((self.width, self.height * 2))
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        self.full_image, self.frames = self.get_frames(image)
+        self.image = self.frames[0]
         self.rect = self.image.get_rect(topleft=(self.x1, self.y1))
         self.scroll_y = 0
         self.paused = False
         self.pause_timer = 0
         self.has_collision = False
-        self.last_update_time = 0  # Время последнего обновления спрайта
-        self.frame_duration = 16  # Продолжительность одного кадра в миллисекундах
 
-    def checkerboard(self, size, cell_size=5):
+    def get_frames(self, image):
+        """
+        Возвращает (full_image, кадры) для размера финиша из общего кэша, создавая их при первом обращении.
+        """
+        key = (self.width, self.height, self.clip_height, id(image) if image else None)
+        cached = self.strips.get(key)
+        if cached is None or (image and cached[0] is not image):
+            full_image = image if image else self.checkerboard((self.width, self.height * 2))
+            strip = pygame.Surface((self.width, max(2 * self.height - 1, 1)), pygame.SRCALPHA)
+            strip.fill((0, 0, 0, 0))
+            strip.blit(full_image, (0, 0))
+            strip.blit(full_image, (0, 2 * self.height - self.clip_height))
+            frames = [strip.subsurface((0, scroll_y, self.width, self.height))
+                      for scroll_y in range(max(full_image.get_height() - self.height, 1))]
+            cached = self.strips[key] = (full_image, frames)
+        return cached
+
+    def get_state(self):
+        """
+        Изменяемое состояние анимации, см. Level.snapshot.
+        """
+        return self.scroll_y, self.paused, self.pause_timer
+
+    def set_state(self, state):
+        self.scroll_y, self.paused, self.pause_timer = state
+        self.image = self.frames[self.scroll_y]
+
+    @staticmethod
+    def checkerboard(size, cell_size=5):
         """
-        Создает изображение в виде шахматной доски.
+        Создает изображение в виде шахматной доски. Неполные клетки у правого и нижнего края остаются черными.
         """
         img = pygame.Surface(size)
-        for row in range(size[1] // cell_size):
-            for col in range(size[0] // cell_size):
-                color = 'black' if (row + col) % 2 == 0 else 'white'
-                pygame.draw.rect(img, color, (col * cell_size, row * cell_size, cell_size, cell_size))
+        cols, rows = size[0] // cell_size, size[1] // cell_size
+        if numpy is not None:
+            col = numpy.arange(size[0]) // cell_size
+            row = numpy.arange(size[1]) // cell_size
+            white = ((col[:, None] + row) % 2 == 1) & (col[:, None] < cols) & (row < rows)
+            pygame.surfarray.blit_array(img, numpy.where(white, img.map_rgb(pygame.Color('white')), img.map_rgb(pygame.Color('black'))))
+            return img
+        for row in range(rows):
+            for col in range(1 - row % 2, cols, 2):
+                img.fill('white', (col * cell_size, row * cell_size, cell_size, cell_size))
         return img
 
     def update(self):
@@ -179,28 +404,18 @@ class AnimatedFinish(pygame.sprite.Sprite):
                 print('!!!')
                 level.load()
 
-        current_time = pygame.time.get_ticks()
-        # Ограничение скорости обновления спрайта на основе времени
-        if current_time - self.last_update_time < self.frame_duration:
-            return  # Пропускаем обновление, если прошло слишком мало времени
-
-        self.last_update_time = current_time  # Обновляем время последнего обновления
-
+        # Вызывается один раз за шаг симуляции (SIM_RATE раз в секунду), один шаг - один кадр анимации
         if self.paused:
             self.pause_timer += 1
             if self.pause_timer >= self.pause_duration:
                 self.paused = False
                 self.pause_timer = 0
         else:
-            self.scroll_y = (self.scroll_y + self.speed) % (self.full_image.get_height() - self.height)
+            self.scroll_y = (self.scroll_y + self.speed) % len(self.frames)
             if self.scroll_y == 0:
                 self.paused = True
 
-        self.image.fill((0, 0, 0, 0))
-        self.image.blit(self.full_image, (0, -self.scroll_y))
-        if self.scroll_y > self.full_image.get_height() - self.height - self.clip_height:
-            overlap = self.scroll_y - (self.full_image.get_height() - self.height - self.clip_height)
-            self.image.blit(self.full_image, (0, self.height - overlap), (0, 0, self.width, overlap))
+        self.image = self.frames[self.scroll_y]
 
 
 class Level:
@@ -214,12 +429,38 @@ class Level:
         'redwall': RedWall,
     }
 
+    # Статичные спрайты заранее рисуются на фон, каждый кадр перерисовываются только изменяемые
+    use_background_cache = True
+    # Пока играется уровень, следующий из file_names собирается в фоновом потоке
+    prefetch = True
+    executor = None  # Общий пул потоков предзагрузки, создается при первой предзагрузке
+    # Собранные уровни: имя файла -> результат build вместе с группой спрайтов и фоном.
+    # Повторный вход на уровень (новая игра, перезапуск) не пересобирает его, пока файл не изменился
+    built_levels = OrderedDict()
+    built_levels_capacity = 16
+    # Соприкасающиеся стены одного типа объединяются при загрузке. preview_level.py это отключает:
+    # после объединения правка одной строки меняет разбиение всей последовательности стен,
+    # и reload() пришлось бы пересоздать их все
+    use_wall_merging = True
+    # Печатать при сборке уровня, сколько стен осталось после объединения (для отладки и бенчмарков)
+    report_wall_merging = False
+
     def __init__(self, file_names):
         self.file_names = file_names
         self.cur_level = 0
-        self.sprites = pygame.sprite.Group()
+        self.sprites = pygame.sprite.Group()  # Спрайты уровня, кроме стен
+        self.walls = walls.WallStore()
+        # Объекты в порядке строк файла для отрисовки: спрайты и диапазоны (начало, конец) стен из self.walls
+        self.layers = []
+        self.dynamic_sprites = pygame.sprite.RenderUpdates()
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.redraw = True  # Нужна полная перерисовка экрана (уровень сменился)
         self.mouse_pos = (0, 0)
         self.levels_ended = False
+        self.merge_report = {}
+        self.prefetched = None  # (имя файла, Future с результатом build)
+        self.start_state = None  # Состояние в начале текущего уровня для reset()
+        self.level_data = None  # Результат build текущего уровня
         self.load()
 
     def load(self, file_name=None):
@@ -227,77 +468,426 @@ class Level:
         Загружает уровень из файла.
         """
         self.sprites = pygame.sprite.Group()
-        self.mouse_pos = pygame.mouse.get_pos()
+        self.mouse_pos = mouse.get_pos()
         if file_name is None:
             if self.cur_level >= len(self.file_names):
                 self.levels_ended = True
                 return False
             file_name = self.file_names[self.cur_level]
             self.cur_level += 1
-        with open(os.path.join('data', file_name), 'r') as f:
-            for line in f.readlines():
-                line = line.strip()
-                if line.startswith('#') or not line:
-                    continue
-                try:
-                    obj, *data = line.split(';')
-                    if obj == 'cursor':
-                        cursor.update((int(data[0]), int(data[1])))
-                        self.mouse_pos = (int(data[0]), int(data[1]))
-                        pygame.mouse.set_pos((int(data[0]), int(data[1])))
-                    elif obj == 'image':
-                        im = load_image(data[0])
-                        obj = Image(tuple(map(int, data[1:3])), im)
-                        self.sprites.add(obj)
-                    elif obj in self.names_to_classes:
-                        obj = self.names_to_classes[obj](tuple(map(int, data)))
-                        self.sprites.add(obj)
-                    else:
-                        print('unknown object in line:', line)
-                except (ValueError, IndexError):
-                    print('error when loading line:', line, '. skipping.')
-        cursor.load_objects(self.sprites)
+        level_data = self.get_built(file_name) or self.take_prefetched(file_name) or self.build(file_name)
+        self.apply(level_data)
+        self.prefetch_next()
         return True
 
+    @staticmethod
+    def get_signature(file_name):
+        """
+        Признак версии файла уровня: время изменения и размер.
+        """
+        stat = os.stat(os.path.join('data', file_name))
+        return stat.st_mtime_ns, stat.st_size
+
+    def get_built(self, file_name):
+        """
+        Возвращает уже собранный уровень, если файл с тех пор не изменился, иначе None.
+        """
+        level_data = self.built_levels.get(file_name)
+        if level_data is None:
+            return None
+        try:
+            signature = self.get_signature(file_name)
+        except OSError:
+            signature = None
+        if level_data['signature'] != signature:
+            del self.built_levels[file_name]
+            return None
+        self.built_levels.move_to_end(file_name)
+        return level_data
+
+    def create_object(self, obj, data):
+        """
+        Создает объект для записи уровня. Строки cursor, image и неизвестные объекты
+        остаются записями (тип, данные), их обрабатывает apply.
+        """
+        if obj in ('cursor', 'image'):
+            return obj, data
+        if obj in self.names_to_classes:
+            return self.names_to_classes[obj](data)
+        return 'unknown', (obj, *data)
+
+    def build(self, file_name):
+        """
+        Разбирает файл уровня и создает стены, финиш и индекс столкновений.
+        Не меняет состояние игры, поэтому может выполняться в фоновом потоке; строки
+        cursor и image (изображения загружаются через общий кэш) применяет apply.
+        """
+        signature = self.get_signature(file_name)
+        records = level_cache.load_records(os.path.join('data', file_name))
+        # Соприкасающиеся стены одного типа объединяются в меньшее число прямоугольников
+        merge_cache, merge_report = {}, {}
+        if self.use_wall_merging:
+            records, merge_report = geometry.merge_walls(records, merge_cache)
+        objects = [self.create_object(obj, data) for obj, data in records]
+        store = walls.WallStore(obj for obj in objects if isinstance(obj, Wall))
+        return {
+            'file_name': file_name,
+            'signature': signature,
+            'records': records,
+            'objects': objects,  # Объект для каждой записи из records
+            'walls': store,
+            'merge_report': merge_report,
+            'merge_cache': merge_cache,
+            'collision': Cursor.build_collision(store),
+        }
+
+    def reload(self, file_name):
+        """
+        Обновляет текущий уровень после изменения его файла. Объекты неизменившихся строк
+        остаются как есть; создаются только объекты новых строк, и только они и удаленные
+        обновляются в индексе столкновений. Возвращает (добавлено, удалено) объектов.
+        Другой уровень загружается через load().
+
+        Файл разбирается без записи бинарного кэша, а массивы для numpy и растровая карта стен
+        не пересобираются (проверка столкновений идет через сетку) - при редактировании это лишняя работа.
+        Поэтому reload() - только для предпросмотра (preview_level.py): новые стены добавляются
+        в конец сетки, и там, где стены перекрываются, столкновение может засчитаться другой
+        стене, чем после полной загрузки.
+        """
+        level_data = self.level_data
+        if level_data is None or level_data['file_name'] != file_name:
+            self.load(file_name)
+            return len(self.level_data['objects']), 0
+
+        signature = self.get_signature(file_name)
+        records = level_cache.parse_level(os.path.join('data', file_name))
+        merge_report = {}
+        if self.use_wall_merging:
+            records, merge_report = geometry.merge_walls(records, level_data['merge_cache'])
+        unused = {}  # Запись -> объекты прежней версии уровня, которые еще не использованы
+        for record, obj in zip(level_data['records'], level_data['objects']):
+            unused.setdefault(record, []).append(obj)
+        objects, added = [], []
+        for record in records:
+            if unused.get(record):
+                objects.append(unused[record].pop())
+            else:
+                obj = self.create_object(*record)
+                objects.append(obj)
+                added.append(obj)
+        removed = [obj for objs in unused.values() for obj in objs]
+
+        store = walls.WallStore(obj for obj in objects if isinstance(obj, Wall))
+        _, collision_index, _, _ = level_data['collision']
+        for obj in removed:
+            if isinstance(obj, Wall):
+                collision_index.remove(obj)
+        for obj in added:
+            if isinstance(obj, Wall):
+                collision_index.add(obj)
+
+        self.apply({
+            'file_name': file_name,
+            'signature': signature,
+            'records': records,
+            'objects': objects,
+            'walls': store,
+            'merge_report': merge_report,
+            'merge_cache': level_data['merge_cache'],
+            'collision': [store, collision_index, None, None],
+        })
+        return len(added), len(removed)
+
+    def apply(self, level_data):
+        """
+        Делает собранный build уровень текущим: ставит курсор, добавляет спрайты
+        в порядке строк файла и рисует фон. Уровень, который уже был текущим, только
+        возвращается в начальное состояние.
+        """
+        self.level_data = level_data
+        self.merge_report = level_data['merge_report']
+        self.walls = level_data['walls']
+        if 'sprites' in level_data:
+            self.sprites = level_data['sprites']
+            self.layers = level_data['layers']
+            self.background = level_data['background']
+            self.dynamic_sprites = level_data['dynamic_sprites']
+            cursor.load_objects(self.walls, level_data['collision'])
+            self.start_state = dict(level_data['start_state'], cur_level=self.cur_level)
+            if not level_data['has_cursor']:
+                # Без строки cursor курсор остается там, где закончился предыдущий уровень
+                self.start_state['mouse_pos'] = self.mouse_pos
+            self.reset()
+            return
+        for obj, (before, after) in self.merge_report.items():
+            if self.report_wall_merging and after < before:
+                print(f"{level_data['file_name']}: {obj} {before} -> {after}")
+        sprites = pygame.sprite.Group()
+        layers = []
+        objects = level_data['objects']
+        has_cursor = False
+        wall_index = 0
+        for i, obj in enumerate(objects):
+            if isinstance(obj, Wall):
+                # Идущие подряд стены рисуются одним диапазоном из self.walls
+                if layers and type(layers[-1]) is tuple:
+                    layers[-1] = (layers[-1][0], wall_index + 1)
+                else:
+                    layers.append((wall_index, wall_index + 1))
+                wall_index += 1
+                continue
+            if isinstance(obj, pygame.sprite.Sprite):
+                sprites.add(obj)
+                layers.append(obj)
+                continue
+            obj, data = obj
+            if obj == 'cursor':
+                cursor.update(data)
+                self.mouse_pos = data
+                cursor.warp(data)
+                has_cursor = True
+            elif obj == 'image':
+                im = load_image(data[0])
+                image = Image(data[1:3], im)
+                objects[i] = image
+                sprites.add(image)
+                layers.append(image)
+            else:
+                print('unknown object in line:', ';'.join(map(str, data)))
+        self.sprites = sprites
+        self.layers = layers
+        cursor.load_objects(self.walls, level_data['collision'])
+        self.render_background()
+        self.start_state = self.snapshot()
+
+        level_data.update(sprites=self.sprites, layers=self.layers, background=self.background,
+                          dynamic_sprites=self.dynamic_sprites, start_state=self.start_state,
+                          has_cursor=has_cursor)
+        self.built_levels[level_data['file_name']] = level_data
+        self.built_levels.move_to_end(level_data['file_name'])
+        if len(self.built_levels) > self.built_levels_capacity:
+            self.built_levels.popitem(last=False)
+
+    def snapshot(self):
+        """
+        Изменяемое состояние уровня: номер уровня, стартовая позиция курсора и состояние анимаций финиша.
+        Стены, поверхности и индекс столкновений не меняются и в снимок не входят.
+        """
+        return {
+            'cur_level': self.cur_level,
+            'mouse_pos': self.mouse_pos,
+            'finishes': [(sprite, sprite.get_state()) for sprite in self.dynamic_sprites
+                         if isinstance(sprite, AnimatedFinish)],
+        }
+
+    def restore(self, state):
+        """
+        Восстанавливает состояние из snapshot() того же уровня.
+        """
+        self.cur_level = state['cur_level']
+        self.mouse_pos = state['mouse_pos']
+        cursor.rect.topleft = self.mouse_pos
+        cursor.prev_pos = cursor.rect.topleft
+        cursor.warp(self.mouse_pos)
+        for sprite, sprite_state in state['finishes']:
+            sprite.set_state(sprite_state)
+        self.redraw = True
+
+    def reset(self):
+        """
+        Перезапускает текущий уровень: курсор на старт, анимации финиша с начала.
+        Уровень не пересобирается, поэтому это дешевле load().
+        """
+        self.restore(self.start_state)
+
+    def prefetch_next(self):
+        """
+        Запускает сборку следующего уровня из file_names в фоновом потоке.
+        """
+        if not self.prefetch or self.cur_level >= len(self.file_names):
+            return
+        if self.get_built(self.file_names[self.cur_level]):
+            return  # Уровень уже собран
+        if Level.executor is None:
+            Level.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-prefetch')
+        file_name = self.file_names[self.cur_level]
+        self.prefetched = (file_name, Level.executor.submit(self.build, file_name))
+
+    def take_prefetched(self, file_name):
+        """
+        Возвращает заранее собранный уровень. Если сборка уже идет, ее результат дожидается:
+        вторая сборка того же уровня в основном потоке конкурировала бы с ней за GIL и запись кэша.
+        None - если предзагружен другой уровень или сборка еще не началась (она отменяется),
+        тогда уровень загружается синхронно.
+        """
+        if self.prefetched is None:
+            return None
+        prefetched_name, future = self.prefetched
+        self.prefetched = None
+        if future.cancel():
+            return None
+        if prefetched_name != file_name:
+            return None  # Сборка другого уровня доработает в фоне, ждать ее незачем
+        return future.result()
+
+    def clear(self):
+        """
+        Убирает все объекты уровня, например, если файл уровня не удалось разобрать.
+        """
+        self.sprites = pygame.sprite.Group()
+        self.walls = walls.WallStore()
+        self.layers = []
+        self.level_data = None
+        cursor.load_objects(self.walls)
+        self.render_background()
+
+    @staticmethod
+    def is_static(sprite):
+        """
+        Статичный спрайт никогда не меняет изображение: стены и картинки без активного состояния.
+        """
+        return isinstance(sprite, Wall) or (isinstance(sprite, Image) and not sprite.image_active)
+
+    def render_background(self):
+        """
+        Заново рисует стены и статичные спрайты уровня на фон и собирает группу изменяемых спрайтов.
+        Вызывается при загрузке уровня и после любого изменения self.sprites, self.walls и self.layers.
+        """
+        # Новая поверхность: прежний фон может храниться в built_levels
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.background.fill((255, 255, 255))
+        self.draw_objects(self.background, dynamic=False)
+        self.dynamic_sprites = pygame.sprite.RenderUpdates()
+        self.redraw = True
+        for sprite in self.sprites:
+            if not self.is_static(sprite):
+                self.dynamic_sprites.add(sprite)
+
+    def draw_objects(self, surface, dynamic=True):
+        """
+        Рисует объекты уровня в порядке строк файла: стены - заливкой диапазонами из self.walls,
+        спрайты - своими изображениями (изменяемые только при dynamic).
+        """
+        for obj in self.layers:
+            if type(obj) is tuple:
+                self.walls.fill(surface, *obj)
+            elif dynamic or self.is_static(obj):
+                surface.blit(obj.image, obj.rect)
+
+    def update(self):
+        """
+        Обновляет спрайты уровня (у статичных спрайтов обновлять нечего).
+        """
+        if self.use_background_cache:
+            self.dynamic_sprites.update()
+        else:
+            self.sprites.update()
+
+    def draw(self, surface):
+        """
+        Рисует уровень: готовый фон со статичными спрайтами и поверх него изменяемые спрайты.
+        """
+        if self.use_background_cache:
+            surface.blit(self.background, (0, 0))
+            self.dynamic_sprites.draw(surface)
+        else:
+            surface.fill((255, 255, 255))
+            self.draw_objects(surface)
+
 
 class Timer(pygame.sprite.Sprite):
     """
     Класс для внутри-игрового таймера.
+    Показывает время забега с точностью до миллисекунды: RunClock по time.perf_counter
+    без времени пауз, а при воспроизведении сессии (deterministic) - по шагам симуляции,
+    чтобы время совпадало с записанным. value - целые секунды по шагам симуляции для лога сессии.
     """
-    font = pygame.font.SysFont('Comic Sans MS', 30)
+    glyphs = text_cache.get_glyphs(FONT_NAME, 30, (255, 155, 255))  # Цифры рисуются из кэша, а не font.render
 
-    def __init__(self):
+    def __init__(self, deterministic=False):
         pygame.sprite.Sprite.__init__(self)
-        self.image = pygame.Surface((70, 30), pygame.SRCALPHA)
+        self.image = pygame.Surface((150, 30), pygame.SRCALPHA)
         self.image.fill((0, 0, 0, 0))
         self.rect = self.image.get_rect()
         self.rect.topright = (WIDTH - 10, 5)
         self.value = 0
-        self.event = pygame.USEREVENT + 2
-        pygame.time.set_timer(self.event, 1000)
+        self.steps = 0  # Шагов симуляции с начала текущей секунды
+        self.total_steps = 0
+        self.clock = frame_scheduler.RunClock(self.step_time if deterministic else time.perf_counter)
+        # Меняющиеся цифры перерисовываются на self.image поверх прежних, строка целиком не рисуется
+        self.line = text_cache.GlyphLine(self.glyphs, self.image, (self.image.get_width(), -6), right=True)
         self.update_next()
 
+    def update(self):
+        """
+        Вызывается один раз за шаг симуляции, каждые SIM_RATE шагов прибавляет секунду к value.
+        """
+        self.steps += 1
+        self.total_steps += 1
+        if self.steps >= SIM_RATE:
+            self.steps = 0
+            self.value += 1
+        self.update_next()
+
+    def step_time(self):
+        return self.total_steps / SIM_RATE
+
+    def elapsed(self):
+        """
+        Время забега в секундах без пауз.
+        """
+        return self.clock.elapsed()
+
+    def pause(self):
+        self.clock.pause()
+
+    def resume(self):
+        self.clock.resume()
+
     def update_next(self):
-        self.image.fill((0, 0, 0, 0))
-        text_surface = self.font.render(str(self.value), True, (255, 155, 255))
-        self.image.blit(text_surface, (70 - text_surface.get_width(), -6))
+        self.line.set_text(format_time(self.elapsed()))
+
+
+def format_time(seconds):
+    """
+    Время в виде м:сс.ммм.
+    """
+    ms = int(seconds * 1000)
+    return f'{ms // 60000}:{ms // 1000 % 60:02}.{ms % 1000:03}'
 
 
 def load_image(name, colorkey=None):
-    fullname = os.path.join('data', name)
-    # если файл не существует, то выходим
-    if not os.path.isfile(fullname):
-        print(f"Файл с изображением '{fullname}' не найден")
+    """
+    Возвращает изображение из data через кэш images. Изображение общее для всех вызовов,
+    его нельзя изменять.
+    """
+    try:
+        return images.get(name, colorkey)
+    except FileNotFoundError as e:
+        # если файл не существует, то выходим
+        print(f"Файл с изображением '{e}' не найден")
         sys.exit()
-    image = pygame.image.load(fullname)
-    if colorkey is not None:
-        image = image.convert()
-        if colorkey == -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey)
-    else:
-        image = image.convert_alpha()
-    return image
+
+
+def level_image_names(directory='data'):
+    """
+    Имена изображений, которые используются в уровнях data/level*.csv.
+    """
+    for file_name in level_cache.level_names(directory):
+        for obj, data in level_cache.load_records(os.path.join(directory, file_name)):
+            if obj == 'image':
+                yield data[0]
+
+
+def preload_images():
+    """
+    Запускает фоновую предзагрузку изображений меню и уровней.
+    """
+    def names():
+        yield from UI_IMAGES
+        yield from level_image_names()
+
+    return images.preload(names())
 
 
 def correct_area_coords(*pos):
@@ -309,12 +899,62 @@ def correct_area_coords(*pos):
     return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
 
 
+def draw_window(background, sprites):
+    """
+    Рисует окно меню: фон и кнопки.
+    В режиме DIRTY_RECTS фон восстанавливается и выводится на экран только под кнопками.
+    """
+    if DIRTY_RECTS:
+        sprites.clear(screen, background)
+        sprites.update()
+        pygame.display.update(sprites.draw(screen))
+    else:
+        screen.fill((0, 0, 0))
+        screen.blit(background, (0, 0))
+        sprites.update()
+        sprites.draw(screen)
+        pygame.display.flip()
+
+
+def update_frame(cursor_group):
+    """
+    Один шаг симуляции: анимация финиша, движение курсора со столкновениями и таймер.
+    """
+    level.update()  # Обновляем спрайты уровня
+    cursor_group.update()  # Обновляем спрайты курсора
+
+
+def draw_frame(cursor_group):
+    """
+    Рисует один кадр игры: уровень, затем курсор и таймер.
+    В режиме DIRTY_RECTS на экран выводятся только изменившиеся области,
+    а полная перерисовка выполняется после смены уровня или паузы.
+    """
+    if DIRTY_RECTS and not level.redraw:
+        level.dynamic_sprites.clear(screen, level.background)
+        cursor_group.clear(screen, level.background)
+        dirty = level.dynamic_sprites.draw(screen) + cursor_group.draw(screen)
+        overlay = profiler.draw(screen)
+        if overlay:
+            dirty.append(overlay)
+        profiler.mark('draw')
+        pygame.display.update(dirty)
+    else:
+        level.draw(screen)  # Отрисовываем фон и спрайты уровня
+        cursor_group.draw(screen)  # Отрисовываем спрайты курсора
+        profiler.draw(screen)
+        profiler.mark('draw')
+        pygame.display.flip()  # Обновляем экран
+        level.redraw = False
+    profiler.mark('flip')
+
+
 def start_window():
     """
     Отображает стартовое окно с кнопками "Играть" и "Правила".
     """
     im = load_image('start_window.png')
-    all_sprites = pygame.sprite.Group()
+    all_sprites = pygame.sprite.RenderUpdates()
     # Создание кнопок с использованием GUIButton
     play_button = GUIButton(
         (313, 407),
@@ -331,6 +971,8 @@ def start_window():
         all_sprites
     )
 
+    screen.blit(im, (0, 0))
+    pygame.display.flip()
     while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -342,11 +984,7 @@ def start_window():
             return  # Нажата кнопка "Правила", выходим из стартового окна
 
         # Отрисовка элементов стартового окна
-        screen.fill((0, 0, 0))
-        screen.blit(im, (0, 0))
-        all_sprites.update()
-        all_sprites.draw(screen)
-        pygame.display.flip()
+        draw_window(im, all_sprites)
         clock.tick(60)
 
 
@@ -355,7 +993,7 @@ def rules_window():
     Отображает окно с правилами игры.
     """
     im = load_image('rules_window.png')
-    all_sprites = pygame.sprite.Group()
+    all_sprites = pygame.sprite.RenderUpdates()
     # Создание кнопки "Играть"
     play_button = GUIButton(
         (594, 520),
@@ -365,6 +1003,8 @@ def rules_window():
         all_sprites
     )
 
+    screen.blit(im, (0, 0))
+    pygame.display.flip()
     while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -374,11 +1014,7 @@ def rules_window():
             return  # Нажата кнопка "Играть", выходим из окна правил
 
         # Отрисовка элементов окна правил
-        screen.fill((0, 0, 0))
-        screen.blit(im, (0, 0))
-        all_sprites.update()
-        all_sprites.draw(screen)
-        pygame.display.flip()
+        draw_window(im, all_sprites)
         clock.tick(60)
 
 
@@ -406,46 +1042,43 @@ def pause_screen():
         clock.tick(60)
 
 
-def end_screen():
+def end_screen(splits=()):
     """
-    Отображает экран окончания игры с результатами
+    Отображает экран окончания игры с результатами и сохраняет забег.
+    splits - время прохождения уровней [(имя файла, секунды), ...].
     """
-    best_available = False
-    # Проверка наличия файла с лучшим рекордом
-    if os.path.exists(os.path.join('data', 'best_record.txt')):
-        with open(os.path.join('data', 'best_record.txt'), 'r') as f:
-            best_value = int(f.readline().strip())
-            best_minutes, best_seconds = best_value // 60, best_value % 60
-            best_available = True
+    value = timer.elapsed()
+    # Лучшие результаты до этого забега: запросы идут по индексам и не зависят от размера истории
+    best_value = records_store.best_total()
+    best_splits = records_store.best_splits(level_name for level_name, _ in splits)
+    records_store.save_run(splits, value)  # Запись в базу - в отдельном потоке
 
-    font = pygame.font.SysFont('Comic Sans MS', 30)
     pygame.mouse.set_visible(True)  # Показываем курсор мыши
     pygame.event.set_grab(False)
 
-    value = timer.value
-    minutes, seconds = value // 60, value % 60
-
     end_surface = load_image('end_window.png')
     screen.blit(end_surface, (0, 0))
 
+    # Надписи берутся из кэша строк, время собирается из кэша символов
     # Отображение текущего времени прохождения
-    current_time_surface = font.render(f'Прохождение: {minutes}:{seconds}', True, (255, 255, 255))
-    screen.blit(current_time_surface, (20, 200))
+    text_cache.draw_text(screen, (20, 200), FONT_NAME, 30, 'Прохождение: ', format_time(value))
 
     # Отображение лучшего времени (если доступно)
-    if best_available:
-        if value < best_value:
-            best_time_surface = font.render(f'Предыдущее лучшее время: {best_minutes}:{best_seconds}', True, (255, 255, 255))
-            with open(os.path.join('data', 'best_record.txt'), 'w') as f:
-                f.write(str(best_value))
-        else:
-            best_time_surface = font.render(f'Лучшее время: {best_minutes}:{best_seconds}', True, (255, 255, 255))
-        screen.blit(best_time_surface, (20, 250))
-    else:
-        with open(os.path.join('data', 'best_record.txt'), 'w') as f:
-            f.write(str(value))
-
-    all_sprites = pygame.sprite.Group()
+    if best_value is not None:
+        label = 'Новый рекорд! Предыдущий: ' if value < best_value else 'Лучшее время: '
+        text_cache.draw_text(screen, (20, 250), FONT_NAME, 30, label, format_time(best_value))
+
+    # Время прохождения уровней в две колонки: текущее и лучшее до этого забега
+    rows = (len(splits) + 1) // 2
+    for i, (level_name, split) in enumerate(splits):
+        text = f'{split:.3f} с'
+        if level_name in best_splits:
+            text += f' (лучшее {best_splits[level_name]:.3f})'
+        color = (255, 255, 150) if split < best_splits.get(level_name, float('inf')) else (255, 255, 255)
+        text_cache.draw_text(screen, (20 + i // rows * 390, 310 + i % rows * 28), FONT_NAME, 20,
+                             f'{level_name[:-4]}: ', text, color)
+
+    all_sprites = pygame.sprite.RenderUpdates()
     # Создание кнопки "Назад"
     back_button = GUIButton(
         (600, 535),
@@ -465,55 +1098,142 @@ def end_screen():
         if back_button.update():
             return  # Нажата кнопка "Назад", возвращаемся в главное меню
 
-        all_sprites.draw(screen)
-        pygame.display.flip()
+        dirty = all_sprites.draw(screen)
+        if DIRTY_RECTS:
+            pygame.display.update(dirty)
+        else:
+            pygame.display.flip()
         clock.tick(60)
 
 
-def main():
+def session_events(prev_level, prev_value):
+    """
+    События шага симуляции для лога сессии: переход на уровень и прибавление секунды таймера.
+    """
+    events = []
+    if level.cur_level != prev_level:
+        events.append((input_log.LEVEL, level.cur_level, 0))
+    if timer.value != prev_value:
+        events.append((input_log.TICK, timer.value, 0))
+    return events
+
+
+def main(record=None, replay=None, fast=False):
+    """
+    Основной цикл игры.
+    record - путь для записи лога сессии, replay - input_log.InputReplay для воспроизведения
+    (мышь не используется, fast - без ожидания кадров, по одному шагу симуляции за кадр).
+    """
     global cursor
     global level
     global timer
-
-    pygame.mouse.set_visible(False)  # Прячем системный курсор мыши
-    pygame.event.set_grab(True)
-    timer = Timer()  # Создаем экземпляр таймера
-    cursor = Cursor((WIDTH / 2, HEIGHT / 2), load_image('cursor.png'))  # Создаем экземпляр курсора
-    cursor_group = pygame.sprite.Group((cursor, timer))  # Группа для курсора и таймера для удобства обновления и отрисовки
-    files = [file for file in os.listdir('data') if file.startswith('level') and file.endswith('.csv')]
-    sorted_files = sorted(files, key=lambda x: int(x[5:-4]))  # Обрезаем "level" и ".csv" и преобразуем в int
-    level = Level(sorted_files)
-    # level = Level(['level1.csv'])
-    cursor.load_objects(level.sprites)  # Загружаем объекты уровня для обработки столкновений
-
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                sys.exit()  # Выход из игры при закрытии окна
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    pause_screen()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    print(event.pos)
-            elif event.type == timer.event:
-                timer.value += 1
-                timer.update_next()
-
-        if level.levels_ended:
-            return end_screen()  # Если все уровни пройдены, переходим на экран окончания игры
-
-        # Отрисовка элементов игры
-        screen.fill((255, 255, 255))  # Заливаем экран белым цветом
-        level.sprites.update()  # Обновляем спрайты уровня
-        level.sprites.draw(screen)  # Отрисовываем спрайты уровня
-        cursor_group.update()  # Обновляем спрайты курсора
-        cursor_group.draw(screen)  # Отрисовываем спрайты курсора
-        pygame.display.flip()  # Обновляем экран
-        # clock.tick(60)  # Контролируем FPS
+    global mouse
+
+    sorted_files = level_cache.level_names()
+    recorder = None
+    if replay:
+        replay.rewind()
+        sorted_files = replay.file_names
+        mouse = replay
+    else:
+        pygame.mouse.set_visible(False)  # Прячем системный курсор мыши
+        pygame.event.set_grab(True)
+        if record:
+            recorder = input_log.InputRecorder(record, sorted_files, SIM_RATE, pygame.mouse)
+            mouse = recorder
+
+    try:
+        timer = Timer(deterministic=bool(replay))  # Создаем экземпляр таймера
+        cursor = Cursor((WIDTH / 2, HEIGHT / 2), load_image('cursor.png'))  # Создаем экземпляр курсора
+        cursor_group = pygame.sprite.RenderUpdates((cursor, timer))  # Группа для курсора и таймера для удобства обновления и отрисовки
+        level = Level(sorted_files)  # Загружает и объекты уровня для обработки столкновений
+        # level = Level(['level1.csv'])
+        scheduler = frame_scheduler.FrameScheduler(SIM_RATE, FPS_CAP, FRAME_MODE)
+        step = 0  # Номер шага симуляции - часы сессии при записи и воспроизведении
+        diverged = False
+        splits = []  # Время прохождения уровней: [(имя файла, секунды), ...]
+        level_start = 0.0
+
+        while True:
+            profiler.begin_frame()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    sys.exit()  # Выход из игры при закрытии окна
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3:
+                        profiler.toggle()
+                        level.redraw = True  # Стереть оверлей, если он скрыт
+                    elif event.key == pygame.K_F4:
+                        profiler.capture()
+                    elif event.key == pygame.K_SPACE and not replay:
+                        if recorder:
+                            recorder.write(input_log.PAUSE)
+                        timer.pause()  # Время паузы не входит во время забега
+                        pause_screen()
+                        timer.resume()
+                        level.redraw = True  # Экран паузы закрыл собой весь кадр
+                        scheduler.reset()  # Время паузы не догоняется симуляцией
+                        profiler.begin_frame()  # Время паузы не попадает в замеры
+                elif event.type == pygame.MOUSEMOTION and not replay:
+                    cursor.add_motion(event.pos)  # Путь мыши между кадрами, см. Cursor.get_path
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == 1:
+                        print(event.pos)
+            profiler.mark('events')
+
+            # Шаги симуляции с фиксированной частотой, ожидание кадра - внутри планировщика
+            steps = 1 if replay and fast else scheduler.tick()
+            profiler.mark('wait')
+            for _ in range(steps):
+                if replay:
+                    if replay.finished(step):
+                        print(f'Воспроизведение закончено: шагов {step}, таймер {timer.value}')
+                        return
+                    expected = [event for event in replay.advance(step) if event[0] != input_log.PAUSE]
+                    for pos in replay.path:
+                        cursor.add_motion(pos)
+                elif recorder:
+                    recorder.sample(step, cursor.motion)
+                prev_level, prev_value = level.cur_level, timer.value
+                update_frame(cursor_group)
+                events = session_events(prev_level, prev_value)
+                if level.cur_level != prev_level or level.levels_ended:
+                    splits.append((level.file_names[prev_level - 1], timer.elapsed() - level_start))
+                    level_start = timer.elapsed()
+                if recorder:
+                    for event in events:
+                        recorder.write(*event)
+                elif replay and events != expected and not diverged:
+                    diverged = True
+                    print(f'Воспроизведение разошлось с записью на шаге {step}: {events} вместо {expected}')
+                step += 1
+                if level.levels_ended:
+                    if replay:
+                        print(f'Воспроизведение: все уровни пройдены за {timer.value} с, шагов {step}')
+                        return
+                    return end_screen(splits)  # Если все уровни пройдены, переходим на экран окончания игры
+            profiler.mark('update')
+
+            # Отрисовка элементов игры. Кадр без шагов симуляции не отличается от предыдущего
+            # (кроме полной перерисовки), а при vsync ожидание кадра выполняет flip()
+            if steps or level.redraw or FRAME_MODE == frame_scheduler.VSYNC:
+                draw_frame(cursor_group)
+            profiler.end_frame()
+    finally:
+        if recorder:
+            recorder.close()
+        mouse = pygame.mouse
 
 
 if __name__ == '__main__':
+    # python main.py [--record файл.rpl | --replay файл.rpl [--fast]], см. input_log
+    args = sys.argv[1:]
+    preload_images()
+    text_cache.preload_fonts(FONTS)
+    if '--replay' in args:
+        main(replay=input_log.InputReplay(args[args.index('--replay') + 1]), fast='--fast' in args)
+        sys.exit()
+    record_path = args[args.index('--record') + 1] if '--record' in args else None
     while True:
         start_window()  # Отображаем стартовое окно
-        main()  # Запускаем основную игру
+        main(record_path)  # Запускаем основную игру
@@ -1,13 +1,12 @@
 import os
 import pygame
 import main
+import frame_scheduler
 import sys
 import time
 import re
-import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import queue
 import logging
 from pathlib import Path
 
@@ -18,11 +17,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 LEVEL_FILE_REGEX = r"level\d+\.csv$"
 TEMP_FILE_REGEX = r"level\d+\.csv~$"
 DIRECTORY_TO_MONITOR = "data"
+DEBOUNCE_TIME = 0.1  # Секунд без новых событий для файла, после которых он перезагружается
+# Событие pygame, которое наблюдатель за файлами отправляет из своего потока (атрибут path)
+LEVEL_FILE_CHANGED = pygame.event.custom_type()
 
 class MyHandler(FileSystemEventHandler):
-    def __init__(self, changed_files_queue):
-        self.changed_files_queue = changed_files_queue
-
+    """
+    Отправляет в очередь событий pygame событие LEVEL_FILE_CHANGED при изменении файла уровня,
+    чтобы главный цикл просыпался от него так же, как от ввода.
+    """
     def on_modified(self, event):
         if event.is_directory:
             return
@@ -34,34 +37,37 @@ class MyHandler(FileSystemEventHandler):
             if file_str.endswith("~"):
                 base_file = Path(file_str[:-1])
                 logging.info(f"Изменен временный файл, обрабатываем базовый: {base_file}")
-                self.changed_files_queue.put(str(base_file))
+                pygame.event.post(pygame.event.Event(LEVEL_FILE_CHANGED, path=str(base_file)))
 
             else:
-                self.changed_files_queue.put(file_str)
+                pygame.event.post(pygame.event.Event(LEVEL_FILE_CHANGED, path=file_str))
             logging.info(f"Файл {file_path} был изменен!")
 
 
-def monitor_files_watchdog(directory_path, changed_files_queue):
-    event_handler = MyHandler(changed_files_queue)
+def monitor_files_watchdog(directory_path):
+    """
+    Запускает наблюдатель watchdog в его собственном потоке и возвращает его.
+    """
     observer = Observer()
-    observer.schedule(event_handler, path=directory_path, recursive=False)
+    observer.daemon = True
+    observer.schedule(MyHandler(), path=directory_path, recursive=False)
     observer.start()
     logging.info(f"Наблюдение за изменениями в директории: {directory_path}")
+    return observer
+
 
-    try:
-        while True:
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        observer.stop()
-        logging.info("Наблюдение за файлами остановлено.")
-    finally:
-        observer.join()
+def update_level(level, level_name):
+    start = time.perf_counter()
+    added, removed = level.reload(level_name)
+    elapsed = (time.perf_counter() - start) * 1000
+    logging.info(f"Уровень {level_name} обновлен за {elapsed:.1f} мс: добавлено объектов {added}, удалено {removed}")
 
 
-def update_level(level, level_name, cursor):
-    level.load(level_name)
-    cursor.load_objects(level.sprites)
-    logging.info(f"Уровень {level_name} обновлен!")
+def is_animated(level):
+    """
+    Есть ли на уровне спрайты, которые меняются сами по себе (анимация финиша).
+    """
+    return any(isinstance(sprite, main.AnimatedFinish) for sprite in level.dynamic_sprites)
 
 
 level_name = 'level1.csv'
@@ -70,63 +76,102 @@ cursor_group = pygame.sprite.Group(cursor)
 main.cursor = cursor
 
 
+main.Level.use_wall_merging = False  # reload() пересоздает только объекты измененных строк
 level = main.Level([level_name])
-cursor.load_objects(level.sprites)
 main.level = level
 
 
-changed_files_queue = queue.Queue()
-file_monitoring_thread = threading.Thread(target=monitor_files_watchdog,
-                                          args=(DIRECTORY_TO_MONITOR, changed_files_queue),
-                                          daemon=True)
-file_monitoring_thread.start()
+observer = monitor_files_watchdog(DIRECTORY_TO_MONITOR)
 
 current_level_name = level_name
+pending_files = {}  # Путь -> время последнего события для него
 activate_cursor = False
+focused = True  # Пока окно без фокуса (например, открыт редактор уровня), анимации стоят
 coords = None
+# Частоту кадров задают шаги симуляции, ожидание - pygame.event.wait() в цикле ниже
+scheduler = frame_scheduler.FrameScheduler(main.SIM_RATE, 0, frame_scheduler.CAP)
 
+# Цикл ждет событий pygame (ввод и LEVEL_FILE_CHANGED от наблюдателя) и просыпается по времени
+# только для шагов анимации и отложенной перезагрузки файлов. Кадр рисуется, только если что-то
+# изменилось, поэтому открытый без дела предпросмотр почти не нагружает процессор
 while True:
-    for event in pygame.event.get():
+    animated = focused and (activate_cursor or is_animated(level))
+    timeouts = [DEBOUNCE_TIME - (time.perf_counter() - changed_time) for changed_time in pending_files.values()]
+    if animated:
+        timeouts.append(scheduler.time_to_next_step())
+    if timeouts:
+        events = [pygame.event.wait(max(1, int(min(timeouts) * 1000) + 1))]
+    else:
+        events = [pygame.event.wait()]  # Ждать без ограничения времени
+    events += pygame.event.get()
+
+    redraw = False
+    for event in events:
         if event.type == pygame.QUIT:
+            observer.stop()
             sys.exit()
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_SPACE:
                 activate_cursor = not activate_cursor
+                scheduler.reset()
+                redraw = True
         elif event.type == pygame.MOUSEBUTTONDOWN:
             coords = event.pos
+            redraw = True
         elif event.type == pygame.MOUSEBUTTONUP:
-            x1, y1 = coords
-            x2, y2 = pygame.mouse.get_pos()
-            x_min, x_max = min(x1, x2), max(x1, x2)
-            y_min, y_max = min(y1, y2), max(y1, y2)
-            print(x_min, y_min, x_max, y_max, sep=';')
+            if coords:
+                x1, y1 = coords
+                x2, y2 = pygame.mouse.get_pos()
+                x_min, x_max = min(x1, x2), max(x1, x2)
+                y_min, y_max = min(y1, y2), max(y1, y2)
+                print(x_min, y_min, x_max, y_max, sep=';')
             coords = None
-
-    try:
-        changed_file = changed_files_queue.get(block=False)
+            redraw = True
+        elif event.type == pygame.MOUSEMOTION:
+            redraw = redraw or coords is not None
+        elif event.type == pygame.WINDOWFOCUSLOST:
+            focused = False
+        elif event.type == pygame.WINDOWFOCUSGAINED:
+            focused = True
+            scheduler.reset()
+        elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWSHOWN):
+            redraw = True
+        elif event.type == LEVEL_FILE_CHANGED:
+            # Редакторы пишут файл в несколько приемов (и через временный файл~), поэтому события
+            # одного файла объединяются, а перезагрузка ждет DEBOUNCE_TIME после последнего из них
+            pending_files[event.path] = time.perf_counter()
+
+    for changed_file, changed_time in list(pending_files.items()):
+        if time.perf_counter() - changed_time < DEBOUNCE_TIME:
+            continue
+        del pending_files[changed_file]
         logging.info(f"Измененный файл из очереди: {changed_file}")
-        if changed_file == os.path.join(DIRECTORY_TO_MONITOR, current_level_name):
-             update_level(level, changed_file, cursor)
-
-        else:
-            new_level_name = os.path.basename(changed_file)
-            try:
+        new_level_name = os.path.basename(changed_file)
+        try:
+            if new_level_name == current_level_name:
+                update_level(level, new_level_name)
+            else:
                 level.load(new_level_name)
-                cursor.load_objects(level.sprites)
                 current_level_name = new_level_name
                 logging.info(f"Уровень переключен на {new_level_name}")
-            except (IndexError, ValueError):
-                level.sprites.empty()
-                cursor.level_objects.empty()
-
-    except queue.Empty:
-        pass
-
-    main.screen.fill((255, 255, 255))
-    level.sprites.update()
-    level.sprites.draw(main.screen)
-    if activate_cursor:
-        cursor_group.update()
+        except (IndexError, ValueError):
+            level.clear()
+        redraw = True
+
+    if animated:
+        steps = scheduler.tick()
+        for _ in range(steps):
+            level.update()
+            if activate_cursor:
+                cursor_group.update()
+        redraw = redraw or steps > 0
+    else:
+        scheduler.reset()  # Без анимации шаги не копятся, чтобы после простоя не догонять их
+    if not redraw and not level.redraw:
+        continue
+
+    level.draw(main.screen)
+    level.redraw = False
 
     if coords:
         x1, y1 = coords
@@ -138,4 +183,3 @@ while True:
 
     cursor_group.draw(main.screen)
     pygame.display.flip()
-    # main.clock.tick(60)
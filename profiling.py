@@ -0,0 +1,157 @@
+"""
+Замеры времени кадра игры по фазам и оверлей с ними.
+
+Фазы кадра main(): events (обработка событий), wait (ожидание кадра в FrameScheduler),
+update (шаги симуляции без проверки столкновений), collision (Cursor.check_collision),
+draw (отрисовка уровня, курсора и таймера) и flip (вывод на экран). Время каждой фазы хранится за последние WINDOW кадров, по ним
+оверлей показывает FPS, среднее и 95-й перцентиль фаз и гистограмму времени кадров.
+
+Клавиши в игре:
+    F3 - показать или скрыть оверлей (замеры идут, только пока он показан);
+    F4 - записать cProfile за CAPTURE_FRAMES кадров в profile_<время>.prof
+         и вывести самые затратные функции в консоль.
+Пока оверлей скрыт и запись не идет, каждая отметка фазы - только проверка флага enabled.
+"""
+import time
+import pstats
+import cProfile
+from collections import deque
+
+import pygame
+
+import text_cache
+
+PHASES = ('events', 'wait', 'update', 'collision', 'draw', 'flip')
+WINDOW = 240  # Кадров в скользящем окне статистики
+REFRESH = 15  # Оверлей перерисовывается раз в REFRESH кадров
+CAPTURE_FRAMES = 300
+HISTOGRAM_MS = 33.3  # Время кадра, которому соответствует полная высота столбца гистограммы
+WIDTH, HEIGHT = 190, 164
+
+
+class FrameProfiler:
+    """
+    Замеры фаз кадра, оверлей и запись cProfile по клавише.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.enabled = False  # Идут замеры фаз (показан оверлей)
+        self.samples = {phase: deque(maxlen=WINDOW) for phase in PHASES}
+        self.frames = deque(maxlen=WINDOW)  # Полное время кадров, мс
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.collision = 0.0  # Время проверки столкновений в текущем кадре, с
+        self.current = {}
+        self.frame_count = 0
+        self.profile = None  # cProfile.Profile, пока идет запись
+        self.capture_left = 0
+        self.font = None
+        self.image = pygame.Surface((WIDTH, HEIGHT))
+        self.rect = self.image.get_rect()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        for samples in self.samples.values():
+            samples.clear()
+        self.frames.clear()
+        self.frame_count = 0
+        self.begin_frame()
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = self.last = self.clock()
+            self.collision = 0.0
+            self.current = {}
+
+    def mark(self, phase):
+        """
+        Заканчивает фазу phase: ее время - с предыдущей отметки или начала кадра.
+        """
+        if self.enabled:
+            now = self.clock()
+            self.current[phase] = self.current.get(phase, 0.0) + now - self.last
+            self.last = now
+
+    def add_collision(self, seconds):
+        self.collision += seconds
+
+    def end_frame(self):
+        if self.profile is not None:
+            self.capture_left -= 1
+            if self.capture_left <= 0:
+                self.stop_capture()
+        if not self.enabled:
+            return
+        # Столкновения проверяются внутри шагов симуляции, поэтому вычитаются из update
+        self.current['update'] = max(self.current.get('update', 0.0) - self.collision, 0.0)
+        self.current['collision'] = self.collision
+        for phase in PHASES:
+            self.samples[phase].append(self.current.get(phase, 0.0) * 1000)
+        self.frames.append((self.last - self.frame_start) * 1000)
+        self.frame_count += 1
+
+    def summary(self):
+        """
+        Среднее и 95-й перцентиль каждой фазы и кадра целиком за окно, мс.
+        """
+        result = {}
+        for name, samples in (*self.samples.items(), ('frame', self.frames)):
+            values = sorted(samples)
+            if values:
+                result[name] = {
+                    'mean': sum(values) / len(values),
+                    'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                }
+        return result
+
+    def render(self):
+        if self.font is None:
+            self.font = text_cache.get_font('Consolas', 14)
+        self.image.fill((30, 30, 30))
+        summary = self.summary()
+        frame_mean = summary.get('frame', {}).get('mean', 0.0)
+        lines = [f'FPS {1000 / frame_mean:.0f}' if frame_mean else 'FPS -']
+        for name in (*PHASES, 'frame'):
+            if name in summary:
+                lines.append(f"{name:<9} {summary[name]['mean']:5.2f} {summary[name]['p95']:5.2f}")
+        for i, line in enumerate(lines):
+            self.image.blit(self.font.render(line, True, (230, 230, 230)), (5, 3 + i * 14))
+
+        # Гистограмма времени последних кадров: столбец на кадр, красный - дольше HISTOGRAM_MS
+        bottom = HEIGHT - 3
+        frames = list(self.frames)[-(WIDTH - 10):]
+        for x, ms in enumerate(frames, 5):
+            height = max(1, round(min(ms / HISTOGRAM_MS, 1.0) * 30))
+            color = (220, 60, 60) if ms > HISTOGRAM_MS else (90, 200, 90)
+            self.image.fill(color, (x, bottom - height, 1, height))
+
+    def draw(self, surface):
+        """
+        Рисует оверлей левее таймера, если он показан. Возвращает измененную область или None.
+        """
+        if not self.enabled:
+            return None
+        if self.frame_count % REFRESH == 1 or self.font is None:
+            self.render()
+        self.rect.topright = (surface.get_width() - 170, 5)
+        surface.blit(self.image, self.rect)
+        return self.rect
+
+    def capture(self, frames=CAPTURE_FRAMES):
+        """
+        Начинает запись cProfile на frames кадров.
+        """
+        if self.profile is not None:
+            return
+        print(f'Запись профиля на {frames} кадров...')
+        self.capture_left = frames
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop_capture(self):
+        self.profile.disable()
+        path = time.strftime('profile_%Y%m%d_%H%M%S.prof')
+        self.profile.dump_stats(path)
+        print(f'Профиль сохранен в {path}')
+        pstats.Stats(self.profile).sort_stats('cumulative').print_stats(20)
+        self.profile = None
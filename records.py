@@ -0,0 +1,171 @@
+"""
+Хранилище результатов: забеги и время прохождения каждого уровня (сплиты) в SQLite.
+
+Таблицы:
+    runs - забег: игрок, время окончания, общее время в секундах, пройдена ли игра целиком;
+    splits - время прохождения уровня (имя файла) в забеге.
+Лучшее общее время и лучший сплит уровня берутся по индексам (completed, total) и
+(level, seconds), поэтому экран окончания игры не замедляется с ростом истории.
+
+Запись идет в отдельном потоке со своим соединением: забег и его сплиты сохраняются одной
+транзакцией, поэтому после сбоя в базе либо весь забег, либо ничего. Чтение - соединением
+основного потока (журнал WAL позволяет читать во время записи).
+
+Прежний рекорд из data/best_record.txt переносится в базу при ее создании.
+"""
+import os
+import time
+import queue
+import atexit
+import getpass
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    total REAL NOT NULL,
+    completed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS splits (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    level TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_best ON runs (completed, total);
+CREATE INDEX IF NOT EXISTS runs_player_best ON runs (player, completed, total);
+CREATE INDEX IF NOT EXISTS splits_best ON splits (level, seconds);
+"""
+LEGACY_RECORD = 'best_record.txt'
+LEGACY_PLAYER = 'Игрок'  # Игрок, под которым сохраняется рекорд, перенесенный из best_record.txt
+
+
+def default_player():
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return 'player'
+
+
+class RecordStore:
+    """
+    Результаты забегов в базе path. Соединения открываются при первом обращении.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = None  # Соединение основного потока для чтения
+        self.queue = queue.Queue()
+        self.writer = None
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def get_connection(self):
+        if self.connection is None:
+            self.connection = self.connect()
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+            self.import_legacy()
+        return self.connection
+
+    def import_legacy(self):
+        """
+        Переносит рекорд из best_record.txt рядом с базой, если в базе еще нет забегов.
+        """
+        legacy_path = os.path.join(os.path.dirname(self.path), LEGACY_RECORD)
+        if not os.path.exists(legacy_path) or self.connection.execute('SELECT 1 FROM runs LIMIT 1').fetchone():
+            return
+        try:
+            with open(legacy_path) as f:
+                total = int(f.readline().strip())
+        except ValueError:
+            return
+        with self.connection:
+            self.connection.execute('INSERT INTO runs (player, finished_at, total, completed) VALUES (?, ?, ?, 1)',
+                                    (LEGACY_PLAYER, os.path.getmtime(legacy_path), total))
+
+    def best_total(self, player=None):
+        """
+        Лучшее общее время пройденной целиком игры (для игрока player или среди всех) или None.
+        """
+        if player is None:
+            row = self.get_connection().execute('SELECT MIN(total) FROM runs WHERE completed = 1').fetchone()
+        else:
+            row = self.get_connection().execute('SELECT MIN(total) FROM runs WHERE player = ? AND completed = 1',
+                                                (player,)).fetchone()
+        return row[0]
+
+    def best_splits(self, levels):
+        """
+        Лучшее время прохождения каждого уровня из levels: {уровень: секунды}, без уровней без результатов.
+        """
+        connection = self.get_connection()
+        result = {}
+        for level in levels:
+            (seconds,) = connection.execute('SELECT MIN(seconds) FROM splits WHERE level = ?', (level,)).fetchone()
+            if seconds is not None:
+                result[level] = seconds
+        return result
+
+    def history(self, player=None, limit=10):
+        """
+        Последние забеги: [(id, игрок, время окончания, общее время, пройдена ли игра), ...].
+        """
+        query = 'SELECT id, player, finished_at, total, completed FROM runs'
+        params = ()
+        if player is not None:
+            query += ' WHERE player = ?'
+            params = (player,)
+        return self.get_connection().execute(query + ' ORDER BY id DESC LIMIT ?', (*params, limit)).fetchall()
+
+    def save_run(self, splits, total, completed=True, player=None):
+        """
+        Ставит забег в очередь записи. splits - [(уровень, секунды), ...] в порядке прохождения.
+        """
+        self.get_connection()  # Схема создается до того, как в базу начнет писать поток
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, name='records-writer', daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+        self.queue.put((player or default_player(), time.time(), total, completed, list(splits)))
+
+    def write_loop(self):
+        connection = self.connect()
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    connection.close()
+                    return
+                player, finished_at, total, completed, splits = item
+                with connection:  # Одна транзакция на забег
+                    run_id = connection.execute(
+                        'INSERT INTO runs (player, finished_at, total, completed) VALUES (?, ?, ?, ?)',
+                        (player, finished_at, total, int(completed))).lastrowid
+                    connection.executemany('INSERT INTO splits (run_id, level, seconds) VALUES (?, ?, ?)',
+                                           [(run_id, level, seconds) for level, seconds in splits])
+            except sqlite3.Error as e:
+                print(f'Не удалось сохранить результат: {e}')
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Ждет, пока все поставленные в очередь забеги будут записаны.
+        """
+        if self.writer is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
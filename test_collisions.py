@@ -0,0 +1,132 @@
+"""
+Аналитическая проверка столкновений против поточечной (эталон) на случайных отрезках.
+
+Запуск: python -m pytest -q
+"""
+import os
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import pytest
+
+import collisions
+import level_cache
+
+
+class Block:
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+
+
+class RedBlock(Block):
+    pass
+
+
+def random_segments(rnd, count, length, width=800, height=600):
+    segments = []
+    while len(segments) < count:
+        x1, y1 = rnd.randrange(width), rnd.randrange(height)
+        x2, y2 = x1 + rnd.randint(-length, length), y1 + rnd.randint(-length, length)
+        if 0 <= x2 < width and 0 <= y2 < height:
+            segments.append(((x1, y1), (x2, y2)))
+    return segments
+
+
+def random_walls(rnd, count):
+    walls = []
+    for _ in range(count):
+        cls = rnd.choice((Block, RedBlock))
+        walls.append(cls((rnd.randrange(800), rnd.randrange(600), rnd.randint(1, 60), rnd.randint(1, 60))))
+    return walls
+
+
+def check_agreement(walls, index, seed, count=1000):
+    """
+    Если поточечная проверка нашла столкновение, аналитическая должна вернуть ту же стену
+    и ту же позицию перед столкновением. Аналитическая может дополнительно (и раньше)
+    находить касания углов, которые шаги по пикселям перескакивают по диагонали.
+    Возвращает список расхождений.
+    """
+    rnd = random.Random(seed)
+    mismatches = []
+    for length in (0, 1, 3, 20, 300):
+        for a, b in random_segments(rnd, count // 5, length):
+            old = collisions.step_line_and_check_collision(a, b, walls)
+            new = collisions.draw_line_and_check_collision(a, b, walls, index=index)
+            if new is not None and not collisions._get_contact(a, b, new['sprite'].rect, 1)[2]:
+                continue  # Касание угла
+            if old is None:
+                if new is not None:
+                    mismatches.append((a, b, old, new))
+            elif new is None or (old['sprite'], old['position_before']) != (new['sprite'], new['position_before']):
+                mismatches.append((a, b, old, new))
+    return mismatches
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('count', (5, 60, 400))
+def test_grid_matches_stepping(seed, count):
+    walls = random_walls(random.Random(seed * 1000 + count), count)
+    assert check_agreement(walls, collisions.UniformGrid(walls), seed) == []
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_without_index_matches_stepping(seed):
+    walls = random_walls(random.Random(seed), 60)
+    assert check_agreement(walls, None, seed, count=500) == []
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_grid_matches_full_scan(seed):
+    # Перебор ячеек вдоль отрезка должен давать то же, что проверка всех стен
+    rnd = random.Random(seed)
+    walls = random_walls(rnd, 300)
+    index = collisions.UniformGrid(walls)
+    for a, b in random_segments(rnd, 500, 300):
+        assert (collisions.draw_line_and_check_collision(a, b, walls, index=index) ==
+                collisions.draw_line_and_check_collision(a, b, walls)), (a, b)
+
+
+def test_grid_remove_compacts():
+    # Повторное удаление и добавление стен (reload в preview_level.py) не растит индекс
+    rnd = random.Random(0)
+    walls = random_walls(rnd, 100)
+    index = collisions.UniformGrid(walls)
+    for _ in range(50):
+        for wall in walls[:20]:
+            index.remove(wall)
+        walls = walls[20:] + random_walls(rnd, 20)
+        for wall in walls[-20:]:
+            index.add(wall)
+    assert len(index) == 100 and len(index.sprites) <= 2 * 100 + 32
+    assert [index.sprites[i] for i in sorted(index.indices.values())] == walls
+    for a, b in random_segments(rnd, 200, 300):
+        assert (collisions.draw_line_and_check_collision(a, b, walls, index=index) ==
+                collisions.draw_line_and_check_collision(a, b, walls)), (a, b)
+
+
+def test_start_inside_wall():
+    wall = Block((10, 10, 20, 20))
+    result = collisions.draw_line_and_check_collision((15, 15), (100, 15), [wall],
+                                                      index=collisions.UniformGrid([wall]))
+    assert result['sprite'] is wall and result['position_before'] == (15, 15)
+
+
+def test_corner_cut():
+    # Отрезок проходит через угол стены между двумя соседними точками поточечной проверки
+    wall = Block((10, 10, 1, 1))
+    assert collisions.step_line_and_check_collision((5, 12), (15, 10), [wall]) is None
+    result = collisions.draw_line_and_check_collision((5, 12), (15, 10), [wall])
+    assert result is not None and result['sprite'] is wall
+
+
+@pytest.mark.parametrize('level', level_cache.level_names())
+def test_levels_match_stepping(level):
+    import main
+    cursor = main.Cursor((main.WIDTH / 2, main.HEIGHT / 2), main.load_image('cursor.png'))
+    main.cursor = cursor
+    main.level = main.Level([level])
+    assert check_agreement(cursor.level_objects, cursor.collision_index, seed=1, count=500) == []
@@ -0,0 +1,162 @@
+"""
+Общий кэш шрифтов и отрисованного текста.
+
+- get_font: шрифт ищется через pygame.font.SysFont (медленный поиск по системным шрифтам)
+  один раз для пары (имя, размер); preload_fonts делает это при запуске игры.
+- render: LRU-кэш отрисованных строк для неизменяемых надписей (подписи, заголовки).
+- GlyphCache / get_glyphs: для текста, который меняется каждый кадр (время забега), каждый
+  символ отрисовывается через font.render один раз, а строка собирается копированием готовых
+  символов. Цифры выравниваются по ширине самой широкой цифры, поэтому при смене цифр
+  остальные символы строки не сдвигаются, и GlyphLine перерисовывает только изменившиеся
+  символы на поверхности, которая уже есть у вызывающего. Кернинг между символами
+  не учитывается; для цифр и знаков времени это незаметно.
+- draw_text: надпись из кэша строк и значение из кэша символов в одну строку.
+Поверхности из кэшей общие, их нельзя изменять.
+"""
+from collections import OrderedDict
+
+import pygame
+
+DIGITS = '0123456789'
+TEXT_CAPACITY = 128  # Отрисованных строк в LRU-кэше
+
+fonts = {}  # (имя, размер) -> pygame.font.Font
+glyph_caches = {}  # (имя, размер, цвет) -> GlyphCache
+texts = OrderedDict()  # (имя, размер, текст, цвет, сглаживание) -> поверхность
+
+
+def get_font(name, size):
+    font = fonts.get((name, size))
+    if font is None:
+        font = fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+def preload_fonts(specs):
+    """
+    Находит шрифты [(имя, размер), ...] заранее, чтобы смена экранов не ждала поиска шрифтов.
+    """
+    for name, size in specs:
+        get_font(name, size)
+
+
+def render(name, size, text, color, antialias=True):
+    """
+    Отрисованная строка из LRU-кэша.
+    """
+    key = (name, size, text, tuple(color), antialias)
+    surface = texts.get(key)
+    if surface is not None:
+        texts.move_to_end(key)
+        return surface
+    surface = texts[key] = get_font(name, size).render(text, antialias, color)
+    if len(texts) > TEXT_CAPACITY:
+        texts.popitem(last=False)
+    return surface
+
+
+def get_glyphs(name, size, color):
+    key = (name, size, tuple(color))
+    glyphs = glyph_caches.get(key)
+    if glyphs is None:
+        glyphs = glyph_caches[key] = GlyphCache(get_font(name, size), color)
+    return glyphs
+
+
+def draw_text(surface, pos, name, size, label, value='', color=(255, 255, 255)):
+    """
+    Рисует неизменяемую надпись label (кэш строк) и сразу за ней меняющееся значение value
+    (кэш символов). Возвращает ширину нарисованного.
+    """
+    x, y = pos
+    label_surface = render(name, size, label, color)
+    surface.blit(label_surface, (x, y))
+    width = label_surface.get_width()
+    if value:
+        width += get_glyphs(name, size, color).render_to(surface, value, (x + width, y)).width
+    return width
+
+
+class GlyphCache:
+    """
+    Символы шрифта font цвета color: символ -> поверхность. Цифры - одной ширины.
+    """
+    def __init__(self, font, color, antialias=True):
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.glyphs = {}
+        self.digit_width = max(font.size(digit)[0] for digit in DIGITS)
+
+    def get(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            glyph = self.font.render(char, self.antialias, self.color)
+            if char in DIGITS and glyph.get_width() != self.digit_width:
+                cell = pygame.Surface((self.digit_width, glyph.get_height()), pygame.SRCALPHA)
+                cell.fill((0, 0, 0, 0))
+                cell.blit(glyph, ((self.digit_width - glyph.get_width()) // 2, 0))
+                glyph = cell
+            self.glyphs[char] = glyph
+        return glyph
+
+    def size(self, text):
+        """
+        Ширина и высота строки, собранной из символов.
+        """
+        glyphs = [self.get(char) for char in text]
+        return sum(glyph.get_width() for glyph in glyphs), max((glyph.get_height() for glyph in glyphs), default=0)
+
+    def render_to(self, surface, text, pos, right=False):
+        """
+        Рисует text на surface с левым верхним углом в pos (при right=True pos - правый верхний угол).
+        Возвращает занятый прямоугольник.
+        """
+        glyphs = [self.get(char) for char in text]
+        x, y = pos
+        if right:
+            x -= sum(glyph.get_width() for glyph in glyphs)
+        left = x
+        for glyph in glyphs:
+            surface.blit(glyph, (x, y))
+            x += glyph.get_width()
+        return pygame.Rect(left, y, x - left, max((glyph.get_height() for glyph in glyphs), default=0))
+
+
+class GlyphLine:
+    """
+    Строка на поверхности surface (с прозрачным фоном background), которая перерисовывается
+    только в изменившихся символах. pos и right - как в GlyphCache.render_to.
+    """
+    def __init__(self, glyphs, surface, pos, right=False, background=(0, 0, 0, 0)):
+        self.glyphs = glyphs
+        self.surface = surface
+        self.pos = pos
+        self.right = right
+        self.background = background
+        self.text = None
+        self.offsets = []  # Координата x каждого символа текущей строки
+
+    def set_text(self, text):
+        if text == self.text:
+            return
+        old = self.text
+        self.text = text
+        if old is not None and len(old) == len(text) and all(
+                self.glyphs.get(a).get_width() == self.glyphs.get(b).get_width() for a, b in zip(old, text)):
+            # Ширины символов совпадают, поэтому остальные символы остаются на своих местах
+            y = self.pos[1]
+            for x, a, b in zip(self.offsets, old, text):
+                if a != b:
+                    glyph = self.glyphs.get(b)
+                    self.surface.fill(self.background, (x, y, glyph.get_width(), glyph.get_height()))
+                    self.surface.blit(glyph, (x, y))
+            return
+
+        self.surface.fill(self.background)
+        rect = self.glyphs.render_to(self.surface, text, self.pos, self.right)
+        self.offsets = []
+        x = rect.x
+        for char in text:
+            self.offsets.append(x)
+            x += self.glyphs.get(char).get_width()
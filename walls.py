@@ -0,0 +1,38 @@
+"""
+Компактное хранилище стен уровня.
+
+Стена - только прямоугольник одного цвета, поэтому вместо спрайта с собственной
+поверхностью на каждую стену уровень хранит параллельные массивы: прямоугольники
+и код типа. Объекты стен (main.Wall, main.RedWall) остаются легкими представлениями
+со __slots__, которые ссылаются на тот же прямоугольник; они нужны проверке
+столкновений, чтобы вернуть задетую стену и ее тип.
+"""
+
+
+class WallStore:
+    """
+    Стены уровня в порядке строк файла: rects (pygame.Rect), kinds (код типа в bytearray),
+    classes (код типа -> класс стены) и views (объекты стен).
+    Итерация и len() - по объектам стен, как у группы спрайтов.
+    """
+    def __init__(self, walls=()):
+        self.views = list(walls)
+        self.rects = [wall.rect for wall in self.views]
+        self.classes = list(dict.fromkeys(map(type, self.views)))
+        codes = {cls: kind for kind, cls in enumerate(self.classes)}
+        self.kinds = bytearray(codes[type(wall)] for wall in self.views)
+
+    def __len__(self):
+        return len(self.views)
+
+    def __iter__(self):
+        return iter(self.views)
+
+    def fill(self, surface, start=0, end=None):
+        """
+        Рисует стены с номерами [start, end) заливкой прямоугольников их цветом.
+        """
+        colors = [cls.color for cls in self.classes]
+        fill = surface.fill
+        for rect, kind in zip(self.rects[start:end], self.kinds[start:end]):
+            fill(colors[kind], rect)